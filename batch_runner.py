@@ -0,0 +1,153 @@
+# ============================================================================
+# batch_runner.py - הרצה ללא ממשק על תיקייה של תיקיות מטופלים
+# ============================================================================
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import json
+import logging
+from pathlib import Path
+import time
+from typing import List
+
+from config import Config
+import metrics
+from pipeline import PatientPipeline, create_ai_client, create_grading_memo, load_rag, load_regulations
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+
+class BatchRunner:
+    """
+    מריץ את התהליך המלא לכל תת-תיקייה של root (תיקייה = מטופל).
+    RAG ו-client נטענים פעם אחת ומשותפים; כל מטופל מקבל תיקיית פלט משלו ב-output_root.
+    """
+
+    def __init__(self, workers: int = 2, incremental: bool = True, refresh_grading: bool = False):
+        self.workers = max(1, workers)
+        self.incremental = incremental
+        self.refresh_grading = refresh_grading
+
+    def find_patient_dirs(self, root: Path, output_root: Path) -> List[Path]:
+        output_root = output_root.resolve()
+        return sorted(
+            d for d in root.iterdir()
+            if d.is_dir() and not d.name.startswith('.') and d.resolve() != output_root
+        )
+
+    def run(self, root: Path, output_root: Path) -> dict:
+        """
+        Returns:
+            סיכום הריצה (נשמר גם ב-output_root/batch_summary.json)
+        """
+        root = Path(root)
+        output_root = Path(output_root)
+        output_root.mkdir(parents=True, exist_ok=True)
+
+        patient_dirs = self.find_patient_dirs(root, output_root)
+        if not patient_dirs:
+            logging.warning(f"לא נמצאו תיקיות מטופלים ב-{root}")
+            return {'patients': []}
+
+        logging.info(f"נמצאו {len(patient_dirs)} מטופלים, {self.workers} במקביל")
+
+        # מטופלים רצים ב-threads באותו תהליך, ולכן המדדים נאספים לריצת ה-batch כולה
+        run_metrics = metrics.start_run(pricing=Config.MODEL_PRICING)
+        ai_client = create_ai_client()
+        grading_memo = create_grading_memo()
+        regulations = load_regulations()
+        with run_metrics.stage('rag_load'):
+            rag = load_rag()
+        logging.info(f"✓ RAG נטען: {len(rag.texts)} רשומות")
+
+        # מחלקים את תהליכי ה-OCR בין המטופלים שרצים במקביל
+        ocr_workers = max(1, Config.OCR_WORKERS // self.workers)
+        started_at = datetime.now().isoformat()
+        patients = [None] * len(patient_dirs)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self._run_patient, patient_dir, output_root,
+                                ai_client, rag, grading_memo, regulations, ocr_workers): i
+                for i, patient_dir in enumerate(patient_dirs)
+            }
+            for future in as_completed(futures):
+                entry = future.result()
+                patients[futures[future]] = entry
+                if entry['status'] == 'ok':
+                    logging.info(f"✓ {entry['patient']}: {entry['total_disability']}% ({entry['seconds']}s)")
+                else:
+                    logging.error(f"❌ {entry['patient']}: {entry['error']}")
+
+        summary = {
+            'started_at': started_at,
+            'finished_at': datetime.now().isoformat(),
+            'input_root': str(root),
+            'succeeded': sum(1 for p in patients if p['status'] == 'ok'),
+            'failed': sum(1 for p in patients if p['status'] != 'ok'),
+            'patients': patients
+        }
+        with open(output_root / "batch_summary.json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        run_metrics.write_json(output_root / "batch_metrics.json")
+        if Config.METRICS_PROMETHEUS_FILE:
+            run_metrics.write_prometheus(Config.METRICS_PROMETHEUS_FILE)
+
+        logging.info(f"סיום: {summary['succeeded']} הצליחו, {summary['failed']} נכשלו")
+        logging.info(f"סיכום נשמר ב: {output_root / 'batch_summary.json'}")
+        return summary
+
+    def _run_patient(self, patient_dir: Path, output_root: Path, ai_client, rag,
+                     grading_memo, regulations, ocr_workers: int) -> dict:
+        """מטופל אחד - שגיאה אצלו לא עוצרת את שאר ה-batch"""
+        output_dir = output_root / patient_dir.name
+
+        def log(message: str, tag: str = ""):
+            message = f"[{patient_dir.name}] {message.strip()}"
+            if tag == "error":
+                logging.error(message)
+            elif tag == "warning":
+                logging.warning(message)
+            else:
+                logging.info(message)
+
+        pipeline = PatientPipeline(
+            ai_client=ai_client,
+            rag=rag,
+            log=log,
+            # לא מדלגים על OCR/חילוץ: קבצים שלא השתנו מגיעים מה-cache של ה-OCR ומה-manifest
+            # של החילוץ, וכך גם מסמך שנוסף לתיק נקלט בהרצה הבאה
+            confirm=lambda title, question: False,
+            ocr_workers=ocr_workers,
+            incremental=self.incremental,
+            grading_memo=grading_memo,
+            refresh_grading=self.refresh_grading,
+            regulations=regulations,
+            streaming=Config.STREAMING_PIPELINE
+        )
+
+        # מדדי המטופל נרשמים ל-recorder משלו ומצטברים גם ל-batch_metrics.json
+        patient_metrics = metrics.MetricsRecorder(Config.MODEL_PRICING, parent=metrics.current())
+        start = time.perf_counter()
+        try:
+            with metrics.bound(patient_metrics):
+                results = pipeline.run(patient_dir, output_dir, ocr_dir=output_dir / "ocr_txt")
+            pipeline.write_metrics(patient_metrics, output_dir, prometheus=False)
+            entry = {
+                'patient': patient_dir.name,
+                'status': 'ok',
+                'total_disability': results.get('total_disability', 0),
+                'output_dir': str(output_dir)
+            }
+        except Exception as e:
+            logging.exception(f"[{patient_dir.name}] נכשל")
+            entry = {'patient': patient_dir.name, 'status': 'error', 'error': str(e)}
+
+        seconds = time.perf_counter() - start
+        metrics.current().record_item('patient', patient_dir.name, seconds)
+        entry['seconds'] = round(seconds, 1)
+        return entry
@@ -0,0 +1,12 @@
+# ============================================================================
+# benchmarks - מדידת תפוקת ה-pipeline בלי קריאות API אמיתיות
+# ============================================================================
+#
+#   python -m benchmarks.fake_openai_server --port 8765 --latency 0.5
+#   python -m benchmarks.synthetic_cases out/case1 --docs 5 --pages 20
+#   python -m benchmarks.run_benchmark --docs 5 --pages 20 --latency 0.5
+#   python -m benchmarks.run_benchmark --docs 5 --pages 20 --preprocess   # זמן לעמוד בכל שלב עם עיבוד מקדים
+#   python -m benchmarks.index_report --extra-corpus rulings.jsonl --scale 20000
+#   python -m benchmarks.memory_report --pages 500 --max-rss-mb 400
+#   python -m benchmarks.memory_report --check
+#   python -m benchmarks.regulation_check
@@ -0,0 +1,171 @@
+# ============================================================================
+# fake_openai_server.py - שרת דמה ל-chat completions
+# ============================================================================
+
+import argparse
+import json
+import logging
+import random
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+from typing import Tuple
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+BODY_PARTS = ["כתף ימין", "גב תחתון", "ברך שמאל", "לב", "ריאות", "שמיעה", "כליות", "עמוד שדרה צווארי", "קרסול ימין"]
+
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    """
+    מחקה את POST /v1/chat/completions עם תשובות קבועות לפי סוג ה-prompt
+    (חילוץ / זיקוק חבילות / קביעת אחוזים), עם השהיה ושיעור שגיאות מוגדרים.
+    """
+    
+    protocol_version = "HTTP/1.1"
+    
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+        
+        time.sleep(max(0.0, random.gauss(server.latency, server.latency * server.jitter)))
+        
+        with server.stats_lock:
+            server.stats['requests'] += 1
+        
+        if random.random() < server.error_rate:
+            with server.stats_lock:
+                server.stats['errors'] += 1
+            if random.random() < 0.5:
+                self._send(429, {"error": {"message": "Rate limit reached (fake)", "type": "requests"}},
+                           headers={"Retry-After": str(server.retry_after)})
+            else:
+                self._send(500, {"error": {"message": "Internal error (fake)"}})
+            return
+        
+        prompt = "\n".join(m.get('content', '') for m in request.get('messages', []))
+        content = json.dumps(self._canned_response(prompt), ensure_ascii=False)
+        
+        prompt_tokens = len(prompt) // 3 + 1
+        completion_tokens = len(content) // 3 + 1
+        self._send(200, {
+            "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get('model', 'fake'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+    
+    def _canned_response(self, prompt: str) -> dict:
+        if 'קבע אחוז נכות' in prompt:
+            match = re.search(r'קבע אחוז נכות מדויק עבור:\s*(.+)', prompt)
+            body_part = match.group(1).strip() if match else "לא מוגדר"
+            percentage = random.choice([0, 10, 20, 30])
+            return {
+                "body_part": body_part,
+                "disability_percentage": percentage,
+                "section_used": "סעיף 2(1)(ב)" if percentage else "N/A",
+                "reasoning": "תשובת דמה של שרת ה-benchmark",
+                "confidence": "medium"
+            }
+        
+        if '"bundles"' in prompt:
+            return {"bundles": [
+                {
+                    "body_part": body_part,
+                    "evidence_text": f"הגבלת תנועה ב{body_part}, כאבים כרוניים, טיפול קבוע",
+                    "main_diagnosis": f"פגיעה ב{body_part}"
+                }
+                for body_part in BODY_PARTS[:self.server.organs]
+            ]}
+        
+        chosen = random.sample(BODY_PARTS, k=min(3, len(BODY_PARTS)))
+        return {
+            "diagnoses": [
+                {
+                    "body_part": body_part,
+                    "condition_hebrew": f"פגיעה ב{body_part}",
+                    "condition_medical_term": "Chronic impairment",
+                    "severity": random.choice(["קל", "בינוני", "חמור"]),
+                    "chronic": True,
+                    "details": "ממצא סינתטי"
+                }
+                for body_part in chosen
+            ],
+            "treatments": ["פיזיותרפיה"],
+            "surgeries": [],
+            "medical_tests": ["MRI"],
+            "functional_limitations": ["קושי בהרמת משאות"]
+        }
+    
+    def _send(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port: int = 0, latency: float = 0.5, jitter: float = 0.2, error_rate: float = 0.0,
+                 retry_after: float = 1.0, organs: int = 5) -> Tuple[ThreadingHTTPServer, str]:
+    """מפעיל את השרת ב-thread ברקע ומחזיר (server, base_url). port=0 בוחר פורט פנוי"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeChatHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.retry_after = retry_after
+    server.organs = organs
+    server.stats = {'requests': 0, 'errors': 0}
+    server.stats_lock = threading.Lock()
+    
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    logging.info(f"שרת OpenAI מדומה פועל ב-{base_url}")
+    return server, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="שרת chat completions מדומה")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="השהיה ממוצעת בשניות")
+    parser.add_argument("--jitter", type=float, default=0.2, help="סטיית תקן יחסית של ההשהיה")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="שיעור תשובות 429/500")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--organs", type=int, default=5, help="מספר איברים בתשובת הזיקוק")
+    args = parser.parse_args()
+    
+    server, base_url = start_server(args.port, args.latency, args.jitter, args.error_rate,
+                                    args.retry_after, args.organs)
+    print(f"OPENAI_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
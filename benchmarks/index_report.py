@@ -0,0 +1,148 @@
+# ============================================================================
+# index_report.py - recall מול זמן חיפוש וזיכרון לכל סוג אינדקס FAISS
+# ============================================================================
+#
+#   python -m benchmarks.index_report                          # rag.json עם מודל ה-embedding
+#   python -m benchmarks.index_report --extra-corpus rulings.jsonl --scale 20000
+#   python -m benchmarks.index_report --random-vectors 50000 --dim 384   # בלי מודל
+
+import argparse
+import json
+import logging
+from pathlib import Path
+import time
+
+import numpy as np
+
+from config import Config
+import vector_index
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+
+def load_corpus_vectors(args) -> np.ndarray:
+    """embeddings של rag.json (ושל קורפוס נוסף), או וקטורים אקראיים מקובצים לבדיקת סקייל בלי מודל"""
+    rng = np.random.default_rng(args.seed)
+    if args.random_vectors:
+        # מקבצים סביב מרכזים - קרוב יותר להתפלגות embeddings אמיתית מרעש אחיד
+        centers = rng.standard_normal((max(1, args.random_vectors // 100), args.dim)).astype(np.float32)
+        assignment = rng.integers(0, len(centers), args.random_vectors)
+        return centers[assignment] + 0.3 * rng.standard_normal((args.random_vectors, args.dim)).astype(np.float32)
+
+    from rag_system import RAGSystem
+    rag = RAGSystem.from_rag_file(args.rag_file, Config.EMBEDDING_MODEL, cache_dir=Config.RAG_CACHE_DIR,
+                                  normalize_embeddings=Config.RAG_NORMALIZE_EMBEDDINGS)
+    vectors = [rag.embeddings]
+
+    for path in args.extra_corpus:
+        texts = read_texts(path)
+        logging.info(f"מקודד {len(texts)} טקסטים מ-{path}")
+        vectors.append(np.asarray(
+            rag.model.encode(texts, show_progress_bar=True, normalize_embeddings=rag.normalize_embeddings),
+            dtype=np.float32
+        ))
+
+    corpus = np.vstack(vectors)
+    if args.scale and args.scale > len(corpus):
+        # הגדלה מלאכותית: עותקים מורעשים של ה-embeddings האמיתיים
+        extra = args.scale - len(corpus)
+        base = corpus[rng.integers(0, len(corpus), extra)]
+        noise = 0.05 * corpus.std() * rng.standard_normal(base.shape).astype(np.float32)
+        corpus = np.vstack([corpus, base + noise])
+    return corpus
+
+
+def read_texts(path: Path) -> list:
+    """JSON (רשימה) או JSONL; כל רשומה טקסט או אובייקט"""
+    raw = Path(path).read_text(encoding='utf-8')
+    items = json.loads(raw) if raw.lstrip().startswith('[') else [json.loads(l) for l in raw.splitlines() if l.strip()]
+    return [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) for item in items]
+
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def evaluate(index_type: str, corpus: np.ndarray, queries: np.ndarray, k: int, params: dict) -> dict:
+    import faiss
+
+    if vector_index.requires_normalized(index_type):
+        corpus, queries = normalized(corpus), normalized(queries)
+        exact = faiss.IndexFlatIP(corpus.shape[1])
+    else:
+        exact = faiss.IndexFlatL2(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, k)
+
+    started = time.perf_counter()
+    index = vector_index.build_index(corpus, index_type, params)
+    build_sec = time.perf_counter() - started
+
+    latencies = []
+    found = np.empty_like(truth)
+    for i in range(len(queries)):
+        started = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k)
+        latencies.append(time.perf_counter() - started)
+        found[i] = ids[0]
+
+    started = time.perf_counter()
+    index.search(queries, k)
+    batch_sec = time.perf_counter() - started
+
+    recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'index_type': index_type,
+        f'recall@{k}': round(float(recall), 4),
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 4),
+        'batch_qps': round(len(queries) / batch_sec, 1) if batch_sec > 0 else None,
+        'build_sec': round(build_sec, 3),
+        'index_mb': round(vector_index.index_bytes(index) / 1024 / 1024, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="השוואת סוגי אינדקס FAISS מול חיפוש מדויק")
+    parser.add_argument("--rag-file", type=Path,
+                        default=Config.RAG_FILE if Config.RAG_FILE.exists() else Config.PROJECT_ROOT / "rag.json")
+    parser.add_argument("--extra-corpus", type=Path, action="append", default=[],
+                        help="JSON/JSONL של פסקי דין או קטעי פסיקה להוספה לקורפוס")
+    parser.add_argument("--scale", type=int, default=0, help="להגדיל את הקורפוס לגודל הזה בעותקים מורעשים")
+    parser.add_argument("--random-vectors", type=int, default=0, help="וקטורים אקראיים במקום embeddings (בלי מודל)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=list(vector_index.INDEX_TYPES), choices=vector_index.INDEX_TYPES)
+    parser.add_argument("--params", type=json.loads, default={}, help='למשל \'{"nlist": 1024, "nprobe": 32}\'')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=Config.OUTPUT_DIR / "index_report.json")
+    args = parser.parse_args()
+
+    corpus = np.ascontiguousarray(load_corpus_vectors(args), dtype=np.float32)
+    rng = np.random.default_rng(args.seed + 1)
+    # שאילתות: וקטורים מהקורפוס עם רעש, כך שיש שכנים קרובים אמיתיים אבל לא התאמה זהה
+    queries = corpus[rng.integers(0, len(corpus), args.queries)]
+    queries = np.ascontiguousarray(queries + 0.1 * corpus.std() * rng.standard_normal(queries.shape), dtype=np.float32)
+    k = min(args.k, len(corpus))
+
+    logging.info(f"קורפוס: {len(corpus)} וקטורים, מימד {corpus.shape[1]}; {len(queries)} שאילתות, k={k}")
+    rows = [evaluate(index_type, corpus, queries, k, args.params) for index_type in args.types]
+
+    recall_key = f'recall@{k}'
+    print(f"\n{'index':<10}{recall_key:>12}{'p50 ms':>10}{'p95 ms':>10}{'batch q/s':>12}{'build s':>10}{'MB':>10}")
+    for row in rows:
+        print(f"{row['index_type']:<10}{row[recall_key]:>12}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{str(row['batch_qps']):>12}{row['build_sec']:>10}{row['index_mb']:>10}")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'corpus_size': len(corpus), 'dim': int(corpus.shape[1]), 'queries': len(queries),
+                   'k': k, 'params': args.params, 'results': rows}, f, ensure_ascii=False, indent=2)
+    print(f"\nנשמר ב: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
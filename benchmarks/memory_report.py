@@ -0,0 +1,175 @@
+# ============================================================================
+# memory_report.py - שיא זיכרון של OCR על PDF סרוק גדול, רגיל מול low_memory
+# ============================================================================
+#
+#   python -m benchmarks.memory_report --pages 500
+#   python -m benchmarks.memory_report --pages 500 --max-rss-mb 400      # יוצא עם 1 אם low_memory חורג
+#   python -m benchmarks.memory_report --pages 200 --skip-tesseract      # רינדור בלבד (בלי tesseract)
+#   python -m benchmarks.memory_report --check                            # בדיקת CI: exit 1 על חריגה
+
+import argparse
+import json
+import logging
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_cases import page_lines, render_page
+from config import Config
+from metrics import peak_rss_mb
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+MODES = ("default", "low_memory")
+DEFAULT_PAGES = 500
+
+# --check: שני המצבים על CHECK_PAGES עמודים בלי tesseract; low_memory חייב להישאר מתחת
+# ל-CHECK_MAX_RSS_MB (אם לא הועבר --max-rss-mb) ומתחת לשיא של המצב הרגיל
+CHECK_PAGES = 100
+CHECK_MAX_RSS_MB = 120
+
+
+def generate_large_pdf(path: Path, pages: int, distinct: int = 10, resolution: int = 150):
+    """
+    PDF סרוק של pages עמודים. מרנדרים רק distinct עמודים שונים ומשכפלים אותם עם pdfium,
+    כך שגם יצירת קובץ של אלפי עמודים לא מחזיקה את כולם בזיכרון.
+    """
+    import pypdfium2 as pdfium
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = Path(tmp) / "source.pdf"
+        rendered = [render_page(page_lines(0, i)) for i in range(min(distinct, pages))]
+        rendered[0].save(source_path, save_all=True, append_images=rendered[1:], resolution=resolution)
+        del rendered
+
+        source = pdfium.PdfDocument(str(source_path))
+        target = pdfium.PdfDocument.new()
+        try:
+            target.import_pages(source, [i % len(source) for i in range(pages)])
+            target.save(str(path))
+        finally:
+            target.close()
+            source.close()
+    logging.info(f"נוצר PDF של {pages} עמודים: {path} ({path.stat().st_size / 1024 / 1024:.1f} MB)")
+
+
+def run_child(args) -> dict:
+    """מצב אחד בתהליך נקי, כדי ששיא ה-RSS לא יושפע מהמצב הקודם"""
+    from ocr_processor import OCRProcessor
+
+    if args.skip_tesseract:
+        import pytesseract
+        pytesseract.image_to_string = lambda image, lang=None: ""
+
+    with tempfile.TemporaryDirectory(prefix="memory_report_") as tmp:
+        work_dir = Path(tmp)
+        input_dir = work_dir / "input"
+        input_dir.mkdir()
+        shutil.copy2(args.pdf, input_dir / args.pdf.name)
+
+        tesseract_path = Config.TESSERACT_PATH if Path(Config.TESSERACT_PATH).exists() else None
+        processor = OCRProcessor(
+            tesseract_path=tesseract_path,
+            languages=Config.OCR_LANGUAGES,
+            workers=1,
+            render_scale=args.scale,
+            pipeline_depth=Config.OCR_PIPELINE_DEPTH,
+            cache_dir=work_dir / "ocr_cache",
+            low_memory=args.child == "low_memory",
+            max_page_pixels=args.max_page_pixels,
+        )
+        started = time.perf_counter()
+        successful, failed = processor.process_directory(input_dir, work_dir / "ocr_txt")
+        return {
+            'mode': args.child,
+            'seconds': round(time.perf_counter() - started, 2),
+            'succeeded': len(successful),
+            'failed': len(failed),
+            'peak_rss_mb': peak_rss_mb()['self'],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="שיא זיכרון של OCR על PDF סרוק גדול")
+    parser.add_argument("--pages", type=int, help=f"ברירת מחדל: {DEFAULT_PAGES} ({CHECK_PAGES} עם --check)")
+    parser.add_argument("--pdf", type=Path, help="PDF קיים במקום PDF סינתטי")
+    parser.add_argument("--scale", type=float, default=Config.OCR_RENDER_SCALE)
+    parser.add_argument("--max-page-pixels", type=int, default=Config.OCR_MAX_PAGE_PIXELS)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--max-rss-mb", type=float, help="סף לשיא ה-RSS במצב low_memory; חריגה = exit 1")
+    parser.add_argument("--skip-tesseract", action="store_true", help="למדוד רינדור בלבד, בלי tesseract")
+    parser.add_argument("--check", action="store_true",
+                        help="בדיקה אוטומטית: low_memory בתוך הסף ונמוך מהמצב הרגיל, אחרת exit 1")
+    parser.add_argument("--output", type=Path, default=Config.OUTPUT_DIR / "memory_report.json")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args)))
+        return 0
+
+    if args.check:
+        args.modes = list(MODES)
+        args.skip_tesseract = True
+        args.max_rss_mb = args.max_rss_mb or CHECK_MAX_RSS_MB
+    if args.pages is None:
+        args.pages = CHECK_PAGES if args.check else DEFAULT_PAGES
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = args.pdf
+        if pdf_path is None:
+            pdf_path = Path(tmp) / f"large_{args.pages}.pdf"
+            generate_large_pdf(pdf_path, args.pages)
+
+        rows = []
+        for mode in args.modes:
+            logging.info(f"=== {mode} ===")
+            command = [sys.executable, "-m", "benchmarks.memory_report", "--child", mode, "--pdf", str(pdf_path),
+                       "--scale", str(args.scale), "--max-page-pixels", str(args.max_page_pixels)]
+            if args.skip_tesseract:
+                command.append("--skip-tesseract")
+            completed = subprocess.run(command, capture_output=True, text=True, cwd=Config.PROJECT_ROOT)
+            if completed.returncode != 0:
+                logging.error(completed.stderr[-2000:])
+                return completed.returncode
+            rows.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(f"\n{'mode':<12}{'peak RSS MB':>14}{'sec':>10}{'files ok':>10}")
+    for row in rows:
+        print(f"{row['mode']:<12}{row['peak_rss_mb']!s:>14}{row['seconds']:>10}{row['succeeded']:>10}")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'pages': args.pages if args.pdf is None else None, 'scale': args.scale,
+                   'max_page_pixels': args.max_page_pixels, 'skip_tesseract': args.skip_tesseract,
+                   'results': rows}, f, ensure_ascii=False, indent=2)
+    print(f"\nנשמר ב: {args.output}")
+
+    low_memory = next((row for row in rows if row['mode'] == "low_memory"), None)
+    if args.max_rss_mb and low_memory and low_memory['peak_rss_mb'] is not None:
+        if low_memory['peak_rss_mb'] > args.max_rss_mb:
+            logging.error(f"low_memory: שיא RSS {low_memory['peak_rss_mb']} MB חורג מ-{args.max_rss_mb} MB")
+            return 1
+        logging.info(f"low_memory: שיא RSS {low_memory['peak_rss_mb']} MB, בתוך הסף של {args.max_rss_mb} MB")
+
+    if args.check:
+        default = next(row for row in rows if row['mode'] == "default")
+        if low_memory['peak_rss_mb'] is None:
+            logging.error("שיא RSS לא זמין בפלטפורמה הזו - אי אפשר לבדוק")
+            return 1
+        if low_memory['failed'] or default['failed']:
+            logging.error("OCR נכשל באחד המצבים")
+            return 1
+        if low_memory['peak_rss_mb'] >= default['peak_rss_mb']:
+            logging.error(f"low_memory ({low_memory['peak_rss_mb']} MB) לא חוסך מול המצב הרגיל "
+                          f"({default['peak_rss_mb']} MB)")
+            return 1
+        logging.info(f"low_memory חוסך {default['peak_rss_mb'] - low_memory['peak_rss_mb']:.1f} MB מול המצב הרגיל")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
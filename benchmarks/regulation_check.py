@@ -0,0 +1,77 @@
+# ============================================================================
+# regulation_check.py - בדיקת אינדקס התקנות מול rag.json: טווחים, רשומות עם כמה סעיפים
+# ============================================================================
+#
+#   python -m benchmarks.regulation_check                 # יוצא עם 1 אם מקרה כלשהו נכשל
+#   python -m benchmarks.regulation_check --rag-file other_rag.json
+
+import argparse
+import logging
+from pathlib import Path
+import sys
+
+from config import Config
+from regulation_index import RegulationIndex
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+# (אחוז, סעיף, האם תקין) - מקרים מתוך rag.json
+CASES = [
+    # "20% עד 100%"
+    (40, "סעיף 11(5)", True),
+    (20, "סעיף 11(5)", True),
+    (10, "סעיף 11(5)", False),
+    # "ללא הפרעות (0%) ועד הפרעות קשות ... (50%)"
+    (25, "סעיף 11(1)", True),
+    (60, "סעיף 11(1)", False),
+    # "(10%) ועד אב העורקים ... (100%)"
+    (70, "סעיף 11(3)", True),
+    # "בין 10% ל-30%"
+    (20, "סעיף 40(6-9)", True),
+    # "0%-30%" לצד אחוזים בודדים
+    (15, "סעיף 12(3)", True),
+    (45, "סעיף 12(3)", False),
+    # רשומה אחת עם סעיפים 12 ו-13: "(0% עד 80%)" שייך ל-12(2), ו-13 הוא סעיף בפני עצמו
+    (80, "סעיף 12(2)", True),
+    (100, "סעיף 12(2)", False),
+    (5, "סעיף 13(1)", True),
+    (50, "סעיף 13(2)", True),
+    (20, "סעיף 13(1)", False),
+    # "FEV1 60-79% ... - 20%" - טווח המדידה אינו טווח נכות
+    (20, "סעיף 5(2)(א)", True),
+    (70, "סעיף 5(2)(א)", False),
+    # נושא ברבים: "(סעיפים 48-3, 49)", "(סעיפים 58-61)", "(סעיפים 76-90)"
+    (20, "סעיף 49", True),
+    (5, "סעיף 60", True),
+    (50, "סעיף 85", True),
+    (40, "סעיף 85", False),
+    # סימוני "(62) ... (63) ..." בתוך הרשומה: לכל סעיף האחוזים שלו
+    (15, "סעיף 62", True),
+    (15, "סעיף 63", False),
+    (10, "סעיף 66", True),
+    # סעיף שאינו באינדקס - אי אפשר לבדוק, לא שגוי
+    (30, "סעיף 150", True),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="בדיקת אינדקס התקנות מול rag.json")
+    parser.add_argument("--rag-file", type=Path,
+                        default=Config.RAG_FILE if Config.RAG_FILE.exists() else Config.PROJECT_ROOT / "rag.json")
+    args = parser.parse_args()
+
+    index = RegulationIndex.from_rag_file(args.rag_file)
+    failures = 0
+    for percentage, section_used, expected_valid in CASES:
+        problem = index.validate({'disability_percentage': percentage, 'section_used': section_used})
+        ok = (problem is None) == expected_valid
+        failures += not ok
+        expected = "תקין" if expected_valid else "לא תקין"
+        print(f"{'✓' if ok else '✗'} {percentage}% {section_used} (צפוי: {expected})" + (f" - {problem}" if problem else ""))
+
+    print(f"\n{len(CASES) - failures}/{len(CASES)} מקרים עברו")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# ============================================================================
+# run_benchmark.py - מדידת זמן, תפוקה וזיכרון לכל שלב ב-pipeline
+# ============================================================================
+
+import argparse
+import importlib.util
+import json
+import logging
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_openai_server import start_server
+from benchmarks.synthetic_cases import generate_case
+from config import Config
+import metrics
+from metrics import peak_rss_mb
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = []
+    
+    def run(self, name: str, fn, unit: str):
+        """מריץ שלב; fn מחזיר (תוצאה, מספר יחידות שעובדו)"""
+        logging.info(f"=== {name} ===")
+        start = time.perf_counter()
+        with metrics.current().stage(name):
+            result, units = fn()
+        elapsed = time.perf_counter() - start
+        
+        self.stages.append({
+            'stage': name,
+            'wall_sec': round(elapsed, 3),
+            'units': units,
+            'unit': unit,
+            'throughput_per_sec': round(units / elapsed, 3) if elapsed > 0 else None,
+            'peak_rss_mb': peak_rss_mb(),
+        })
+        return result
+    
+    def skip(self, name: str, reason: str):
+        logging.warning(f"=== {name}: דילוג - {reason} ===")
+        self.stages.append({'stage': name, 'skipped': reason})
+    
+    def report(self) -> str:
+        lines = [f"{'stage':<22}{'wall(s)':>10}{'units':>8}  {'throughput':<18}{'peak RSS MB (self/children)':>28}"]
+        for s in self.stages:
+            if 'skipped' in s:
+                lines.append(f"{s['stage']:<22}{'skipped: ' + s['skipped']}")
+                continue
+            rss = s['peak_rss_mb']
+            throughput = f"{s['throughput_per_sec']} {s['unit']}/s"
+            lines.append(f"{s['stage']:<22}{s['wall_sec']:>10}{s['units']:>8}  {throughput:<18}"
+                         f"{str(rss['self']) + ' / ' + str(rss['children']):>28}")
+        return "\n".join(lines)
+
+
+def _tesseract_available() -> bool:
+    return bool(shutil.which("tesseract")) or Path(Config.TESSERACT_PATH).exists()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark מקצה לקצה עם שרת OpenAI מדומה")
+    parser.add_argument("--case-dir", type=Path, help="תיק קיים (ברירת מחדל: תיק סינתטי חדש)")
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--images", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.5, help="השהיית השרת המדומה בשניות")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--organs", type=int, default=5)
+    parser.add_argument("--ocr-workers", type=int, default=Config.OCR_WORKERS)
+    parser.add_argument("--extract-workers", type=int, default=Config.EXTRACTION_CONCURRENCY)
+    parser.add_argument("--analysis-workers", type=int, default=Config.ANALYSIS_CONCURRENCY)
+    parser.add_argument("--rag-file", type=Path,
+                        default=Config.RAG_FILE if Config.RAG_FILE.exists() else Config.PROJECT_ROOT / "rag.json")
+    parser.add_argument("--rag-queries", type=int, default=50)
+    parser.add_argument("--skip-ocr", action="store_true", help="להשתמש בטקסט ה-ground truth במקום OCR")
+    parser.add_argument("--preprocess", action="store_true", help="עיבוד מקדים לתמונות לפני tesseract")
+    parser.add_argument("--json", type=Path, help="שמירת התוצאות כ-JSON")
+    args = parser.parse_args()
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="docanalyzer_bench_"))
+    timer = StageTimer()
+    metrics.start_run(pricing=Config.MODEL_PRICING)
+    server, base_url = start_server(latency=args.latency, error_rate=args.error_rate, organs=args.organs)
+    
+    try:
+        if args.case_dir:
+            case_dir = args.case_dir
+        else:
+            def run_generate():
+                case = generate_case(work_dir / "case", args.docs, args.pages, args.images)
+                return case, case['pages']
+            
+            case_dir = timer.run("generate_case", run_generate, "pages")['dir']
+        
+        # --- OCR ---
+        ocr_dir = work_dir / "ocr_txt"
+        if args.skip_ocr or not _tesseract_available():
+            timer.skip("OCRProcessor", "tesseract לא זמין" if not args.skip_ocr else "--skip-ocr")
+            # תיק סינתטי מגיע עם ground_truth; תיק אמיתי - עם ocr_txt מריצה קודמת של ה-pipeline, אם יש
+            existing_text = next((case_dir / name for name in ("ground_truth", "ocr_txt")
+                                  if (case_dir / name).is_dir()), None)
+            if existing_text is None:
+                logging.error(f"אין ב-{case_dir} תיקיית ground_truth או ocr_txt - אי אפשר לדלג על OCR")
+                return 1
+            shutil.copytree(existing_text, ocr_dir)
+        else:
+            from ocr_processor import OCRProcessor
+            ocr = OCRProcessor(
+                tesseract_path=Config.TESSERACT_PATH if Path(Config.TESSERACT_PATH).exists() else None,
+                languages=Config.OCR_LANGUAGES,
+                workers=args.ocr_workers,
+                render_scale=Config.OCR_RENDER_SCALE,
+                cache_dir=work_dir / "ocr_cache",
+                preprocess=args.preprocess,
+                preprocess_dpi=Config.OCR_PREPROCESS_TARGET_DPI
+            )
+            
+            def run_ocr():
+                successful, _ = ocr.process_directory(case_dir, ocr_dir)
+                return successful, count_case_pages(case_dir)
+            
+            timer.run("OCRProcessor", run_ocr, "pages")
+            print_page_timings()
+        
+        # --- חילוץ ---
+        from medical_extractor import MedicalJSONExtractor
+        from openai_client import OpenAIClient
+        from rate_limiter import RateLimitScheduler
+        
+        ai_client = OpenAIClient(
+            api_key="benchmark",
+            model=Config.GPT_MODEL,
+            base_url=base_url,
+            scheduler=RateLimitScheduler(requests_per_minute=100000, tokens_per_minute=10 ** 9)
+        )
+        extractor = MedicalJSONExtractor(ai_client, max_workers=args.extract_workers,
+                                         chunk_size=Config.MAX_CHUNK_SIZE)
+        json_dir = work_dir / "extracted_json"
+        json_dir.mkdir()
+        
+        def run_extraction():
+            return extractor.extract_from_directory(ocr_dir, json_dir), len(list(ocr_dir.glob("*.txt")))
+        
+        medical_data = timer.run("MedicalJSONExtractor", run_extraction, "files")
+        
+        # --- RAG ---
+        # rag_system מייבא את התלויות האלה רק בשימוש הראשון, כך ש-import שלו לא מגלה שהן חסרות
+        missing = [name for name in ("sentence_transformers", "faiss") if importlib.util.find_spec(name) is None]
+        if missing:
+            timer.skip("RAGSystem", f"חסרה תלות: {', '.join(missing)}")
+            timer.skip("DisabilityAnalyzer", "דורש RAG")
+            return
+        from pipeline import load_rag
+        
+        def run_rag_load():
+            # אותה טעינה כמו בריצה רגילה (hybrid, חלוקה לסעיפים, סוג האינדקס מההגדרות), עם cache זמני
+            rag = load_rag(args.rag_file, cache_dir=work_dir / "rag_cache")
+            return rag, len(rag.texts)
+        
+        rag = timer.run("RAGSystem (cold)", run_rag_load, "sections")
+        timer.run("RAGSystem (warm)", run_rag_load, "sections")
+        
+        queries = [f"סעיפי ליקוי בביטוח לאומי עבור איבר {i}: הגבלת תנועה וכאבים" for i in range(args.rag_queries)]
+        
+        def run_queries():
+            return [rag.query(q, k=7) for q in queries], len(queries)
+        
+        timer.run("RAGSystem.query", run_queries, "queries")
+        
+        def run_queries_batched():
+            return rag.query_many(queries, k=7), len(queries)
+        
+        timer.run("RAGSystem.query_many", run_queries_batched, "queries")
+        
+        # --- ניתוח ---
+        from disability_analyzer import DisabilityAnalyzer
+        analyzer = DisabilityAnalyzer(ai_client, rag, max_workers=args.analysis_workers,
+                                      organ_timeout=Config.ORGAN_TIMEOUT_SEC)
+        def run_analysis():
+            results = analyzer.analyze_patient_data(medical_data)
+            return results, len(results['full_results'])
+        
+        timer.run("DisabilityAnalyzer", run_analysis, "organs")
+    finally:
+        server.shutdown()
+        report = timer.report()
+        print("\n" + report)
+        print(f"\nשרת מדומה: {server.stats['requests']} בקשות, {server.stats['errors']} שגיאות מוזרקות")
+        
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'stages': timer.stages, 'fake_server': server.stats,
+                           'metrics': metrics.current().snapshot()}, f, ensure_ascii=False, indent=2)
+        
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_page_timings():
+    """זמן ממוצע לעמוד בכל שלב של ה-OCR - להשוואת ריצה עם --preprocess מול ריצה בלעדיו"""
+    latencies = metrics.current().snapshot()['latency_sec']
+    steps = [name for name in latencies if name.startswith('ocr_') and name.endswith('_seconds')]
+    for name in sorted(steps, key=lambda name: name == 'ocr_page_seconds'):
+        summary = latencies[name]
+        logging.info(f"  {name[len('ocr_'):-len('_seconds')]:<24} ממוצע {summary['mean']:.3f}s"
+                     f"  p95 {summary['p95']:.3f}s  ({summary['count']} עמודים)")
+
+
+def count_case_pages(case_dir: Path) -> int:
+    """מספר העמודים בתיק (לחישוב עמודים לשנייה)"""
+    import pypdfium2 as pdfium
+    
+    pages = 0
+    for path in case_dir.iterdir():
+        if path.suffix.lower() == '.pdf':
+            pdf = pdfium.PdfDocument(str(path))
+            pages += len(pdf)
+            pdf.close()
+        elif path.suffix.lower() in ('.png', '.jpg', '.jpeg'):
+            pages += 1
+    return pages
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# ============================================================================
+# synthetic_cases.py - יצירת תיקי מטופל סינתטיים (PDF סרוקים ותמונות)
+# ============================================================================
+
+import argparse
+import logging
+from pathlib import Path
+import random
+from typing import List
+
+from PIL import Image, ImageDraw, ImageFont, features
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+HEBREW_LINES = [
+    "סיכום אשפוז - המחלקה לאורתופדיה",
+    "המטופל סובל מכאבים כרוניים בכתף ימין",
+    "הגבלה בטווח התנועה: סיבוב פנימי 30 מעלות",
+    "בדיקת MRI הדגימה קרע ברוטטור קאף",
+    "בוצע ניתוח בנקרט, החלמה חלקית",
+    "אבחנה: אנמיה כרונית, המוגלובין 9.5",
+    "הומלץ על פיזיותרפיה פעמיים בשבוע",
+    "בלט דיסק L4-L5 עם הקרנה לרגל שמאל",
+]
+ENGLISH_LINES = [
+    "Discharge summary - Department of Orthopedics",
+    "Diagnosis: Rotator cuff tear, right shoulder",
+    "Range of motion: abduction 90 degrees, internal rotation 30",
+    "Hb 9.5 g/dL, chronic anemia, iron supplementation",
+    "Recommendation: physiotherapy, follow-up in 3 months",
+    "MRI: L4-L5 disc protrusion with nerve root contact",
+]
+
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+]
+
+
+def _load_font(size: int):
+    for path in FONT_CANDIDATES:
+        if Path(path).exists():
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default()
+
+
+def _visual(line: str) -> str:
+    """בלי libraqm, Pillow מצייר משמאל לימין - הופכים שורות עבריות לסדר חזותי"""
+    if features.check('raqm') or not any('\u0590' <= ch <= '\u05ff' for ch in line):
+        return line
+    return line[::-1]
+
+
+def render_page(lines: List[str], width: int = 1240, height: int = 1754, noise: float = 0.0) -> Image.Image:
+    """עמוד A4 ב-150 DPI בגווני אפור, עם רעש אופציונלי שמדמה פקס"""
+    page = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    font = _load_font(28)
+    
+    y = 80
+    for line in lines:
+        if y > height - 80:
+            break
+        draw.text((width - 80, y), _visual(line), fill=0, font=font, anchor="ra")
+        y += 48
+    
+    if noise:
+        for _ in range(int(width * height * noise)):
+            page.putpixel((random.randrange(width), random.randrange(height)), random.choice((0, 255)))
+    
+    return page
+
+
+def page_lines(doc_index: int, page_index: int, lines_per_page: int = 30) -> List[str]:
+    rng = random.Random(doc_index * 10007 + page_index)
+    lines = [f"מסמך {doc_index + 1} - עמוד {page_index + 1}"]
+    for _ in range(lines_per_page):
+        lines.append(rng.choice(HEBREW_LINES if rng.random() < 0.7 else ENGLISH_LINES))
+    return lines
+
+
+def generate_case(output_dir: Path, docs: int = 3, pages: int = 10, images: int = 1,
+                  noise: float = 0.0, seed: int = 0) -> dict:
+    """
+    יוצר תיקייה עם docs קבצי PDF סרוקים (pages עמודים בכל אחד) ו-images תמונות PNG.
+    הטקסט המקורי נשמר ב-ground_truth/ כך שאפשר להריץ חילוץ גם בלי tesseract.
+    """
+    random.seed(seed)
+    output_dir = Path(output_dir)
+    truth_dir = output_dir / "ground_truth"
+    truth_dir.mkdir(parents=True, exist_ok=True)
+    
+    total_pages = 0
+    for doc_index in range(docs):
+        all_lines = [page_lines(doc_index, page_index) for page_index in range(pages)]
+        rendered = [render_page(lines, noise=noise) for lines in all_lines]
+        rendered[0].save(output_dir / f"case_doc_{doc_index + 1:03d}.pdf", save_all=True,
+                         append_images=rendered[1:], resolution=150)
+        (truth_dir / f"case_doc_{doc_index + 1:03d}.txt").write_text(
+            "\n\n".join("\n".join(lines) for lines in all_lines), encoding='utf-8'
+        )
+        total_pages += pages
+    
+    for image_index in range(images):
+        lines = page_lines(docs + image_index, 0)
+        render_page(lines, noise=noise).save(output_dir / f"case_scan_{image_index + 1:03d}.png")
+        (truth_dir / f"case_scan_{image_index + 1:03d}.txt").write_text("\n".join(lines), encoding='utf-8')
+        total_pages += 1
+    
+    logging.info(f"נוצר תיק סינתטי ב-{output_dir}: {docs} PDF, {images} תמונות, {total_pages} עמודים")
+    return {'dir': output_dir, 'documents': docs + images, 'pages': total_pages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="יצירת תיק מטופל סינתטי")
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--images", type=int, default=1)
+    parser.add_argument("--noise", type=float, default=0.0, help="שיעור פיקסלי רעש (למשל 0.01)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    generate_case(args.output_dir, args.docs, args.pages, args.images, args.noise, args.seed)
+
+
+if __name__ == "__main__":
+    main()
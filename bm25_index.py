@@ -0,0 +1,110 @@
+# ============================================================================
+# bm25_index.py - אינדקס לקסיקלי (BM25) עם טוקניזציה לעברית
+# ============================================================================
+
+import math
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# ניקוד וטעמים (בלי המקף העברי, שמפריד בין מילים)
+_NIQQUD = re.compile(r'[\u0591-\u05BD\u05BF-\u05C7]')
+# גרש/גרשיים בתוך מילה (ד"ל, גר') - מוחקים כדי שקיצור יהיה טוקן אחד
+_GERESH = re.compile(r'(?<=[א-ת])["\'\u05F3\u05F4]')
+_FINAL_LETTERS = str.maketrans('ךםןףץ', 'כמנפצ')
+_TOKEN = re.compile(r'[a-z]+|[א-ת]+|\d+')
+# הפניות לסעיפים: "5(4)", "סעיף 2: (1)", "30. (1)", "29-10" -> "§5.4" וכו'
+_SECTION_REF = re.compile(r'(\d+)\s*[:.\-]?\s*\(\s*(\d+)\s*\)|(\d+)-(\d+)')
+
+# אותיות השימוש שנצמדות לתחילת מילה (ו, ה, ב, ל, מ, ש, כ)
+_PREFIXES = set('והבלמשכ')
+_STOPWORDS = {
+    'של', 'עם', 'או', 'על', 'את', 'לא', 'בלא', 'ללא', 'כל', 'גם', 'אם', 'הוא', 'היא', 'עד',
+    'מעל', 'בין', 'יש', 'אין', 'כמו', 'לפי', 'אשר', 'כי', 'זה', 'זו', 'רק', 'יותר',
+    'the', 'of', 'and', 'or', 'with', 'in', 'to',
+}
+
+
+def tokenize_hebrew(text: str) -> List[str]:
+    """
+    טוקנים ל-BM25: בלי ניקוד, אותיות סופיות מנורמלות, לטינית באותיות קטנות.
+    למילה עברית עם אות שימוש בהתחלה נוסף גם הטוקן בלי התחילית (ובלי שתי תחיליות),
+    ולכל הפניה לסעיף נוסף טוקן "§סעיף.תת-סעיף".
+    """
+    text = _NIQQUD.sub('', text.lower())
+    text = _GERESH.sub('', text)
+
+    tokens = []
+    for match in _SECTION_REF.finditer(text):
+        major, minor = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+        tokens.append(f"§{int(major)}.{int(minor)}")
+
+    for token in _TOKEN.findall(text.translate(_FINAL_LETTERS)):
+        if token in _STOPWORDS or (len(token) == 1 and not token.isdigit()):
+            continue
+        tokens.append(token)
+        if len(token) >= 4 and token[0] in _PREFIXES:
+            tokens.append(token[1:])
+            if len(token) >= 5 and token[1] in _PREFIXES:
+                tokens.append(token[2:])
+
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 על רשימת טקסטים קבועה (postings בזיכרון, ניקוד וקטורי ב-NumPy)"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_count = 0
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: Dict[str, float] = {}
+        self._norm: np.ndarray = None
+
+    def fit(self, texts: List[str]) -> "BM25Index":
+        self.doc_count = len(texts)
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths = np.zeros(len(texts), dtype=np.float32)
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize_hebrew(text)
+            lengths[doc_id] = len(tokens)
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        avg_length = float(lengths.mean()) if len(texts) else 0.0
+        # k1 * (1 - b + b * |d| / avgdl) - חלק המכנה שתלוי רק במסמך
+        self._norm = self.k1 * (1 - self.b + self.b * lengths / (avg_length or 1.0))
+
+        self._postings = {
+            token: (np.fromiter(counts.keys(), dtype=np.int64), np.fromiter(counts.values(), dtype=np.float32))
+            for token, counts in postings.items()
+        }
+        self._idf = {
+            token: math.log((self.doc_count - len(counts) + 0.5) / (len(counts) + 0.5) + 1)
+            for token, counts in postings.items()
+        }
+        return self
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for token in set(tokenize_hebrew(query)):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            doc_ids, tf = posting
+            scores[doc_ids] += self._idf[token] * tf * (self.k1 + 1) / (tf + self._norm[doc_ids])
+        return scores
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """k המסמכים עם הציון הגבוה ביותר (רק מסמכים שיש להם טוקן משותף עם השאילתה)"""
+        scores = self.scores(query)
+        k = min(k, self.doc_count)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
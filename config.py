@@ -18,21 +18,75 @@ class Config:
     EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     GPT_MODEL = "gpt-4o"
     
+    # OpenAI rate limits (לפי ה-tier של החשבון)
+    OPENAI_RPM = 500
+    OPENAI_TPM = 30000
+    
+    # Metrics - מחירי מודלים בדולר למיליון טוקנים (prompt, completion)
+    MODEL_PRICING = {"gpt-4o": (2.5, 10.0)}
+    METRICS_PROMETHEUS_FILE = os.getenv('METRICS_PROMETHEUS_FILE')  # למשל textfile collector של node exporter
+    
+    # LLM response cache (opt-in)
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '0') == '1'
+    LLM_CACHE_MAX_MB = 200
+    LLM_CACHE_TTL_HOURS = 24 * 7
+    
+    # Extraction Settings
+    EXTRACTION_CONCURRENCY = 4  # קריאות GPT במקביל בחילוץ
+    MAX_CHUNK_SIZE = 12000  # תווים; מסמך ארוך יותר מחולץ במקטעים (None = בלי פיצול)
+    STREAMING_PIPELINE = True  # חילוץ כל מסמך מיד כשה-OCR שלו מסתיים, וטעינת RAG במקביל
+    STREAM_QUEUE_SIZE = 8  # קבצי TXT שממתינים לחילוץ; כשהתור מלא ה-OCR ממתין
+    
+    # Analysis Settings
+    ANALYSIS_CONCURRENCY = 4  # איברים שמנותחים במקביל
+    ORGAN_TIMEOUT_SEC = 180
+    GRADING_MEMO_ENABLED = True  # איבר שהראיות והסעיפים שלו לא השתנו לא נשלח שוב ל-GPT
+    GRADING_MEMO_REFRESH = os.getenv('GRADING_MEMO_REFRESH', '0') == '1'  # לדרג מחדש את כל האיברים
+    GRADING_VALIDATE = True  # בדיקת הסעיף והאחוז מול rag.json ושאלה חוזרת רק לאיבר שלא תואם
+    GRADING_MAX_REASKS = 1
+    
+    # Batch Settings (main.py --batch)
+    BATCH_CONCURRENCY = 2  # מטופלים שמעובדים במקביל
+    
     # RAG Settings
-    DEFAULT_TOP_K = 6
-    MAX_CHUNK_SIZE = 2000
+    DEFAULT_TOP_K = 6  # סעיפים שנשלפים לכל איבר בדירוג
+    RAG_NORMALIZE_EMBEDDINGS = False
+    RAG_HYBRID = True  # FAISS + BM25 (איחוד RRF)
+    RAG_RRF_K = 60
+    # סוג אינדקס FAISS: flat_l2 / flat_ip / hnsw / ivf_pq / sq8 / pq (השוואה: benchmarks/index_report.py)
+    RAG_INDEX_TYPE = os.getenv('RAG_INDEX_TYPE', 'flat_l2')
+    RAG_INDEX_PARAMS = {}  # למשל {'nlist': 1024, 'nprobe': 32, 'm': 48} ל-ivf_pq
+    RAG_CONTEXT_TOKEN_BUDGET = 1500  # טוקנים (משוער) לסעיפי התקנות ב-prompt של כל איבר
+    # סף מרחק L2 בריבוע שמעליו סעיף לא נכנס להקשר (None - בלי סף). תלוי בנרמול: עם embeddings מנורמלים 0-4
+    RAG_CONTEXT_MAX_DISTANCE = None
+    RAG_CLAUSE_CHUNKS = True  # חיפוש על תתי-סעיפים ושליחת רק תתי-הסעיפים שנמצאו (+ כותרת הסעיף)
     
     # Paths
     PROJECT_ROOT = Path(__file__).parent
     OUTPUT_DIR = PROJECT_ROOT / "output"
     RAG_FILE = Path(r"C:\Users\user1\Documents\justice\rag.json") 
+    RAG_CACHE_DIR = PROJECT_ROOT / "rag_cache"
+    LLM_CACHE_PATH = OUTPUT_DIR / "llm_cache.sqlite"
+    GRADING_MEMO_PATH = OUTPUT_DIR / "grading_memo.sqlite"
+    OCR_CACHE_DIR = Path(os.getenv('OCR_CACHE_DIR', PROJECT_ROOT / "ocr_cache"))  # אפשר להפנות ל-NFS משותף
     
     # OCR Settings
     TESSERACT_PATH = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
     OCR_LANGUAGES = "heb+eng"
+    OCR_WORKERS = os.cpu_count() or 1
+    OCR_RENDER_SCALE = 2
+    OCR_PIPELINE_DEPTH = 4  # עמודים מרונדרים שממתינים ל-OCR
+    # זיכרון חסום לתיקים של מאות עמודים סרוקים: גווני אפור, תקרת פיקסלים, טקסט נשמר לדיסק
+    OCR_LOW_MEMORY = os.getenv('OCR_LOW_MEMORY', '0') == '1'
+    OCR_MAX_PAGE_PIXELS = 2480 * 3508  # A4 ב-300 DPI; עמוד גדול יותר מרונדר ב-scale קטן יותר
+    # עיבוד מקדים לפני tesseract (גווני אפור, הקטנה, יישור, בינריזציה) - לסריקות פקס רועשות
+    OCR_PREPROCESS = os.getenv('OCR_PREPROCESS', '0') == '1'
+    OCR_PREPROCESS_TARGET_DPI = 300
+    PDF_USE_TEXT_LAYER = True
+    PDF_TEXT_LAYER_MIN_CHARS = 50  # מתחת לזה העמוד נחשב סרוק ועובר OCR
     
-    # Retry settings
-    MAX_RETRIES = 2 
+    # Retry settings - ניסיונות חוזרים לקריאת OpenAI בשגיאה זמנית (429/5xx/timeout)
+    MAX_RETRIES = 5
     
     # Ensure directories exist
     OUTPUT_DIR.mkdir(exist_ok=True)
@@ -3,34 +3,164 @@
 # disability_analyzer.py - המנתח 
 # ============================================================================
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
+import hashlib
 import json
 import logging
+import time
 from typing import List, Dict
 
+import metrics
+from regulation_index import RegulationIndex
+from response_cache import ResponseCache
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
 class DisabilityAnalyzer:
-    def __init__(self, openai_client, rag_system):
+    # להעלות בכל שינוי ב-prompt הדירוג - פוסל את כל התוצאות השמורות ב-memo
+    GRADING_PROMPT_VERSION = 2
+    
+    def __init__(self, openai_client, rag_system, max_workers: int = 1, organ_timeout: float = None,
+                 rag_k: int = 7, memo: ResponseCache = None, refresh_memo: bool = False,
+                 context_token_budget: int = None, max_distance: float = None,
+                 regulations: RegulationIndex = None, max_reasks: int = 1):
         self.ai = openai_client
         self.rag = rag_system
+        self.rag_k = rag_k
+        # תקציב טוקנים ל-סעיפי התקנות ב-prompt, וסף מרחק שמעליו סעיף לא נחשב רלוונטי (None - בלי הגבלה)
+        self.context_token_budget = context_token_budget
+        self.max_distance = max_distance
+        self.max_workers = max(1, max_workers or 1)
+        self.organ_timeout = organ_timeout
+        # memo אופציונלי - איבר שהראיות והסעיפים שנשלפו עבורו לא השתנו לא נשלח שוב ל-GPT.
+        # refresh_memo - מתעלם מתוצאות שמורות (ומחליף אותן בחדשות)
+        self.memo = memo
+        self.refresh_memo = refresh_memo
+        # regulations - בדיקה מקומית של הסעיף והאחוז שהוחזרו; רק איבר שהתשובה שלו לא תואמת
+        # לתקנות נשאל שוב (עד max_reasks פעמים)
+        self.regulations = regulations
+        self.max_reasks = max_reasks
 
     def analyze_patient_data(self, medical_json: dict) -> dict:
         logging.info("--- התחלת ניתוח בשיטת 'חבילות ראיות' לפי איברים ---")
         
-        evidence_bundles = self._create_evidence_bundles(medical_json)
-        results = []
-        for bundle in evidence_bundles:
-            result = self._analyze_single_organ(bundle)
-            if result:
-                results.append(result)
-
+        run_metrics = metrics.current()
+        with run_metrics.stage('bundling'):
+            evidence_bundles = self._create_evidence_bundles(medical_json)
+        
+        with run_metrics.stage('retrieval'):
+            retrieved = self._prefetch_sections(evidence_bundles)
+        
+        with run_metrics.stage('grading'):
+            if self.max_workers > 1 and len(evidence_bundles) > 1:
+                organ_results = self._analyze_organs_concurrently(evidence_bundles, retrieved)
+            else:
+                organ_results = [
+                    self._analyze_organ_isolated(bundle, sections)
+                    for bundle, sections in zip(evidence_bundles, retrieved)
+                ]
+        
+        # הסדר נשמר לפי סדר החבילות, בלי קשר לסדר הסיום
+        results = [result for result in organ_results if result]
         
         return self._calculate_combined_disability(results)
 
+    def _prefetch_sections(self, bundles: List[dict]) -> List[list]:
+        """
+        שליפת הסעיפים לכל האיברים בקריאה אחת ל-RAG (קידוד ב-batch וחיפוש FAISS אחד).
+        אם השליפה המרוכזת נכשלת כל איבר שולף לעצמו בזמן הניתוח.
+        """
+        if not bundles:
+            return []
+        try:
+            queries = [
+                self._rag_query(bundle.get('body_part', ''), bundle.get('evidence_text', ''))
+                for bundle in bundles
+            ]
+            return self.rag.query_many(queries, k=self.rag_k)
+        except Exception as e:
+            logging.warning(f"שליפת סעיפים מרוכזת נכשלה, שולף לכל איבר בנפרד: {e}")
+            return [None] * len(bundles)
+
+    def _analyze_organs_concurrently(self, bundles: List[dict], retrieved: List[list]) -> List[dict]:
+        """
+        ניתוח כל האיברים במקביל (עד max_workers בו-זמנית).
+        איבר שנכשל או שחרג מ-organ_timeout (מרגע שהתחיל) מקבל תוצאת שגיאה
+        ולא עוצר את שאר ההערכה.
+        """
+        logging.info(f"מנתח {len(bundles)} איברים במקביל (עד {self.max_workers} בו-זמנית)")
+        
+        results: List[dict] = [None] * len(bundles)
+        started: Dict[int, float] = {}
+        
+        def run(i: int, bundle: dict) -> dict:
+            started[i] = time.monotonic()
+            return self._analyze_single_organ_timed(bundle, retrieved[i])
+        
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        run = metrics.propagate(run)
+        futures = {pool.submit(run, i, bundle): i for i, bundle in enumerate(bundles)}
+        pending = set(futures)
+        
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                
+                for future in done:
+                    i = futures[future]
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        results[i] = self._failed_organ_result(bundles[i], e)
+                
+                if self.organ_timeout:
+                    now = time.monotonic()
+                    for future in list(pending):
+                        i = futures[future]
+                        if i in started and now - started[i] > self.organ_timeout:
+                            pending.discard(future)
+                            results[i] = self._failed_organ_result(
+                                bundles[i], TimeoutError(f"חריגה מ-{self.organ_timeout} שניות")
+                            )
+        finally:
+            # קריאה שנתקעה ממשיכה ברקע, אבל התוצאה שלה כבר לא נאספת
+            pool.shutdown(wait=False, cancel_futures=True)
+        
+        return results
+
+    def _analyze_organ_isolated(self, bundle: dict, retrieved: list = None) -> dict:
+        try:
+            return self._analyze_single_organ_timed(bundle, retrieved)
+        except Exception as e:
+            return self._failed_organ_result(bundle, e)
+
+    def _analyze_single_organ_timed(self, bundle: dict, retrieved: list = None) -> dict:
+        started = time.perf_counter()
+        try:
+            return self._analyze_single_organ(bundle, retrieved)
+        finally:
+            metrics.current().record_item('grading', bundle.get('body_part', '?'), time.perf_counter() - started)
+
+    def _failed_organ_result(self, bundle: dict, error: Exception) -> dict:
+        """תוצאה לאיבר שהניתוח שלו נכשל - 0% עם סיבת הכישלון, כדי שיופיע בדוח"""
+        body_part = bundle.get('body_part', 'לא מוגדר')
+        logging.error(f"   {body_part}: הניתוח נכשל - {error}")
+        
+        reason = f"הניתוח האוטומטי נכשל ({error}) - יש להריץ שוב או לבדוק ידנית"
+        return {
+            "body_part": body_part,
+            "disability_percentage": 0,
+            "section_used": "N/A",
+            "reasoning": reason,
+            "confidence": "low",
+            "missing_info": reason,
+            "status": "שגיאה"
+        }
+
     def _create_evidence_bundles(self, medical_json: dict) -> List[dict]:
         """שלב הזיקוק: איחוד כל הממצאים לאיברים ייחודיים"""
         logging.info("מזקק ראיות לפי איברים...")
@@ -80,15 +210,33 @@ class DisabilityAnalyzer:
         
         return bundles
 
-    def _analyze_single_organ(self, bundle: dict) -> dict:
-        """ניתוח ממוקד לאיבר אחד: RAG ו-GPT"""
+    def _rag_query(self, body_part: str, evidence: str) -> str:
+        return f"סעיפי ליקוי בביטוח לאומי עבור {body_part}: {evidence}"
+
+    def _analyze_single_organ(self, bundle: dict, retrieved: list = None) -> dict:
+        """ניתוח ממוקד לאיבר אחד: RAG ו-GPT (retrieved - סעיפים שכבר נשלפו מראש)"""
         body_part = bundle['body_part']
         evidence = bundle['evidence_text']
         
         logging.info(f"🔍 מנתח איבר: {body_part} {evidence}")
 
-        rag_query = f"סעיפי ליקוי בביטוח לאומי עבור {body_part}: {evidence}"
-        context = self.rag.query_as_context(rag_query, k=7)
+        if retrieved is None:
+            retrieved = self.rag.query(self._rag_query(body_part, evidence), k=self.rag_k)
+        retrieved, context, context_tokens = self.rag.select_context(
+            retrieved, self.context_token_budget, self.max_distance
+        )
+        logging.info(f"   הקשר: {len(retrieved)} סעיפים, כ-{context_tokens} טוקנים")
+
+        memo_key = None
+        if self.memo:
+            memo_key = self._memo_key(body_part, evidence, retrieved, context)
+            cached = None if self.refresh_memo else self.memo.get(memo_key)
+            if cached is not None:
+                metrics.current().increment('grading_memo_hits')
+                result = json.loads(cached)
+                logging.info(f"   {body_part}: {result.get('disability_percentage', 0)}% (מ-memo)")
+                return result
+            metrics.current().increment('grading_memo_misses')
 
         prompt = f"""
         אתה מומחה רפואי לוועדות נכות של ביטוח לאומי.
@@ -118,13 +266,9 @@ class DisabilityAnalyzer:
         }}
         """
         
-        response = self.ai.call(
-            prompt=prompt,
-            system_prompt="אתה מומחה בתקנות ביטוח לאומי. ענה רק ב-JSON תקני. אל תחזיר טקסט נוסף.",
-            response_format={"type": "json_object"}
-        )
+        result = self._grade(prompt)
+        result = self._validate_and_reask(body_part, prompt, result)
         
-        result = json.loads(response)
         if not result.get('disability_percentage') or result.get('disability_percentage') == 0:
             result['missing_info'] = result.get('reasoning', 'לא נמצא סעיף מתאים')
             result['status'] = 'חסר מידע'
@@ -133,7 +277,66 @@ class DisabilityAnalyzer:
             result['status'] = 'הושלם'
         logging.info(f"   {body_part}: {result.get('disability_percentage', 0)}% ({result.get('section_used', 'N/A')})")
         
+        if memo_key:
+            self.memo.put(memo_key, json.dumps(result, ensure_ascii=False))
+        return result
+
+    def _grade(self, prompt: str) -> dict:
+        response = self.ai.call(
+            prompt=prompt,
+            system_prompt="אתה מומחה בתקנות ביטוח לאומי. ענה רק ב-JSON תקני. אל תחזיר טקסט נוסף.",
+            response_format={"type": "json_object"}
+        )
+        return json.loads(response)
+
+    def _validate_and_reask(self, body_part: str, prompt: str, result: dict) -> dict:
+        """
+        בודק את הסעיף והאחוז מול אינדקס התקנות. תשובה שלא תואמת נשלחת שוב עם תיאור הבעיה;
+        אם גם אחרי הניסיונות החוזרים היא לא תואמת - נשמרת עם validation_warning לבדיקה ידנית.
+        """
+        if self.regulations is None:
+            return result
+        
+        run_metrics = metrics.current()
+        problem = self.regulations.validate(result)
+        for _ in range(self.max_reasks):
+            if problem is None:
+                break
+            run_metrics.increment('grading_reasks')
+            logging.warning(f"   {body_part}: התשובה לא תואמת לתקנות ({problem}) - שואל שוב")
+            try:
+                reasked = self._grade(prompt + f"""
+        **תיקון**: בתשובה קודמת נקבעו {result.get('disability_percentage')}% לפי "{result.get('section_used')}",
+        אבל {problem}. בחר סעיף ואחוז שמופיעים בסעיפי התקנות שלמעלה, בדיוק כפי שהם כתובים שם.
+        """)
+            except Exception as e:
+                # JSON פגום, שגיאת API או timeout - התשובה הראשונה עדיין שמישה, נשארים איתה עם האזהרה
+                logging.warning(f"   {body_part}: השאלה החוזרת נכשלה ({e}) - נשאר עם התשובה הקודמת")
+                break
+            result, problem = reasked, self.regulations.validate(reasked)
+        
+        if problem is None:
+            run_metrics.increment('grading_validation_passed')
+        else:
+            run_metrics.increment('grading_validation_failed')
+            logging.warning(f"   {body_part}: התשובה עדיין לא תואמת לתקנות - {problem}")
+            result['validation_warning'] = problem
         return result
+
+    def _memo_key(self, body_part: str, evidence: str, retrieved: list, context: str) -> str:
+        """
+        כל מה שקובע את תוצאת הדירוג: האיבר, הראיות, הסעיפים שנשלפו (מזהים ותוכן),
+        גרסת ה-prompt והמודל
+        """
+        return ResponseCache.make_key(
+            kind='grading',
+            prompt_version=self.GRADING_PROMPT_VERSION,
+            model=getattr(self.ai, 'model', None),
+            body_part=body_part,
+            evidence=evidence,
+            section_ids=[meta.get('section_number') for _, meta, _ in retrieved],
+            context=hashlib.sha256(context.encode('utf-8')).hexdigest()
+        )
     def _calculate_combined_disability(self, results: List[dict]) -> dict:
         """חישוב משוקלל סופי של כל התוצאות (נוסחת בלבנד)"""
         
@@ -148,7 +351,8 @@ class DisabilityAnalyzer:
             summary_details.append({
                 "organ": res['body_part'],
                 "percent": p,
-                "section": res.get('section_used', 'לא צוין')
+                "section": res.get('section_used', 'לא צוין'),
+                "validation_warning": res.get('validation_warning')
             })
 
         percentages.sort(reverse=True)
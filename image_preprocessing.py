@@ -0,0 +1,196 @@
+# ============================================================================
+# image_preprocessing.py - עיבוד מקדים לתמונת עמוד לפני tesseract (NumPy וקטורי)
+# ============================================================================
+#
+# גווני אפור -> הקטנה ל-DPI יעד -> יישור (deskew) -> בינריזציה מקומית (Sauvola).
+# כל שלב מודד את הזמן שלו, כדי לבדוק שהעיבוד המקדים חוסך ב-tesseract יותר ממה שהוא עולה.
+
+import logging
+import math
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+from PIL import Image
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+# משקלי הבהירות של ITU-R 601 בנקודה קבועה /65536 - אותם משקלים ועיגול של Image.convert('L')
+_LUMA = (19595, 38470, 7471)
+
+DEFAULT_DPI = 300  # כשהתמונה לא מציינת DPI
+
+SKEW_MAX_DEGREES = 5.0
+SKEW_STEP_DEGREES = 0.25
+SKEW_MIN_DEGREES = 0.3  # הטיה קטנה מזו לא מפריעה ל-tesseract ולא שווה סיבוב
+SKEW_MAX_POINTS = 50_000  # דגימה של פיקסלים כהים - מספיקה להערכת הזווית
+
+SAUVOLA_K = 0.2
+SAUVOLA_R = 128.0
+STRIP_ROWS = 512  # גווני אפור ובינריזציה עובדים ברצועות כדי שהמערכים הזמניים לא יהיו בגודל העמוד כולו
+
+
+def image_dpi(image: Image.Image) -> float:
+    dpi = image.info.get('dpi')
+    if isinstance(dpi, (tuple, list)) and dpi:
+        dpi = dpi[0]
+    try:
+        dpi = float(dpi)
+    except (TypeError, ValueError):
+        return DEFAULT_DPI
+    return dpi if dpi > 1 else DEFAULT_DPI
+
+
+def to_grayscale(image: Image.Image) -> np.ndarray:
+    """מערך uint8 בגווני אפור; שקיפות מולחמת על רקע לבן"""
+    if image.mode == 'L':
+        return np.asarray(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    elif image.mode != 'RGB':
+        return np.asarray(image.convert('L'))
+
+    rgb = np.asarray(image)
+    result = np.empty(rgb.shape[:2], dtype=np.uint8)
+    for top in range(0, rgb.shape[0], STRIP_ROWS):
+        strip = rgb[top:top + STRIP_ROWS]
+        # dtype מפורש - ב-NumPy 1.x מערך uint8 כפול סקלר נשאר uint8 וגולש
+        gray = np.multiply(strip[..., 0], np.uint32(_LUMA[0]), dtype=np.uint32)
+        term = np.empty_like(gray)
+        for channel in (1, 2):
+            np.multiply(strip[..., channel], np.uint32(_LUMA[channel]), out=term, dtype=np.uint32)
+            gray += term
+        gray += 1 << 15
+        gray >>= 16
+        result[top:top + STRIP_ROWS] = gray
+    return result
+
+
+def downscale_to_dpi(gray: np.ndarray, dpi: float, target_dpi: float) -> Tuple[np.ndarray, float]:
+    """
+    מקטין ל-target_dpi (אף פעם לא מגדיל). יחס שלם - ממוצע בלוקים מסכום של פרוסות
+    strided ב-uint16 (עד יחס 16 אין גלישה), יחס שבור - BOX של PIL. מחזיר (מערך, DPI חדש).
+    """
+    if not target_dpi or dpi <= target_dpi * 1.05:
+        return gray, dpi
+    ratio = dpi / target_dpi
+    factor = round(ratio)
+    if abs(ratio - factor) < 0.05 and factor <= 16:
+        height, width = (gray.shape[0] // factor) * factor, (gray.shape[1] // factor) * factor
+        total = np.zeros((height // factor, width // factor), dtype=np.uint16)
+        for row in range(factor):
+            for col in range(factor):
+                total += gray[row:height:factor, col:width:factor]
+        area = factor * factor
+        return ((total + area // 2) // area).astype(np.uint8), dpi / factor
+
+    size = (max(1, round(gray.shape[1] / ratio)), max(1, round(gray.shape[0] / ratio)))
+    return np.asarray(Image.fromarray(gray).resize(size, Image.BOX)), target_dpi
+
+
+def estimate_skew(gray: np.ndarray, max_degrees: float = SKEW_MAX_DEGREES,
+                  step: float = SKEW_STEP_DEGREES) -> float:
+    """
+    זווית ההטיה במעלות לפי projection profile: הזווית שבה ההיטל של הפיקסלים הכהים
+    על ציר ה-y הכי "חד" (שורות טקסט נופלות לתאים בודדים). כל הזוויות מחושבות
+    ב-bincount אחד - כל זווית מקבלת טווח תאים משלה.
+    הזווית במוסכמה של PIL (חיובית = נגד כיוון השעון), כך ש-deskew מסובב ב-(-זווית).
+    """
+    threshold = min(128, int(gray.mean()) - 30)
+    ys, xs = np.nonzero(gray < threshold)
+    if len(ys) < 100:
+        return 0.0
+    if len(ys) > SKEW_MAX_POINTS:
+        chosen = np.random.default_rng(0).choice(len(ys), SKEW_MAX_POINTS, replace=False)
+        ys, xs = ys[chosen], xs[chosen]
+
+    angles = np.deg2rad(np.arange(-max_degrees, max_degrees + step / 2, step))
+    x = xs.astype(np.float32) - gray.shape[1] / 2
+    y = ys.astype(np.float32) - gray.shape[0] / 2
+    # y של כל נקודה אחרי סיבוב בכל אחת מהזוויות: (זוויות, נקודות)
+    rotated = np.outer(np.cos(angles), y) - np.outer(np.sin(angles), x)
+    span = int(math.hypot(*gray.shape)) + 2
+    bins = (rotated + span / 2).astype(np.int64) + (np.arange(len(angles)) * span)[:, None]
+    profiles = np.bincount(bins.ravel(), minlength=len(angles) * span).reshape(len(angles), span)
+    scores = (profiles.astype(np.float64) ** 2).sum(axis=1)
+    return -float(np.rad2deg(angles[int(scores.argmax())]))
+
+
+def deskew(gray: np.ndarray, angle: float) -> np.ndarray:
+    if abs(angle) < SKEW_MIN_DEGREES:
+        return gray
+    rotated = Image.fromarray(gray).rotate(-angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+    return np.asarray(rotated)
+
+
+def binarize(gray: np.ndarray, window: int, k: float = SAUVOLA_K, r: float = SAUVOLA_R) -> np.ndarray:
+    """
+    בינריזציה מקומית (Sauvola): סף = m * (1 + k * (s / r - 1)) לכל פיקסל, לפי ממוצע m
+    וסטיית תקן s בחלון window x window. הסכומים בחלון מחושבים מ-integral image של הרצועה,
+    כך שהעלות לא תלויה בגודל החלון. מחזיר uint8 של 0 (דיו) ו-255 (רקע).
+    """
+    window |= 1
+    half = window // 2
+    height, width = gray.shape
+    padded = np.pad(gray, half, mode='edge')
+    area = float(window * window)
+    result = np.empty((height, width), dtype=np.uint8)
+    for top in range(0, height, STRIP_ROWS):
+        bottom = min(top + STRIP_ROWS, height)
+        slab = padded[top:bottom + window - 1].astype(np.float64)
+        rows = bottom - top
+
+        def window_mean(values):
+            table = np.zeros((values.shape[0] + 1, values.shape[1] + 1))
+            np.cumsum(values, axis=0, out=table[1:, 1:])
+            np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+            total = (table[window:window + rows, window:window + width] - table[:rows, window:window + width]
+                     - table[window:window + rows, :width] + table[:rows, :width])
+            return (total / area).astype(np.float32)
+
+        # הסכומים מדויקים ב-float64, והסף עצמו מחושב במקום ב-float32
+        mean = window_mean(slab)
+        threshold = window_mean(slab * slab)
+        threshold -= mean * mean
+        np.maximum(threshold, 0, out=threshold)
+        np.sqrt(threshold, out=threshold)
+        threshold *= k / r
+        threshold += 1 - k
+        threshold *= mean
+        result[top:bottom] = (gray[top:bottom] > threshold) * np.uint8(255)
+    return result
+
+
+def preprocess(image: Image.Image, target_dpi: float = 300) -> Tuple[Image.Image, Dict[str, float]]:
+    """
+    מכין תמונת עמוד ל-tesseract.
+    Returns:
+        (תמונת PIL בשחור-לבן במצב L, זמן כל שלב בשניות)
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(step: str):
+        nonlocal started
+        now = time.perf_counter()
+        timings[step] = now - started
+        started = now
+
+    gray = to_grayscale(image)
+    lap('grayscale')
+    gray, dpi = downscale_to_dpi(gray, image_dpi(image), target_dpi)
+    lap('downscale')
+    angle = estimate_skew(gray)
+    gray = deskew(gray, angle)
+    lap('deskew')
+    binary = binarize(gray, window=max(15, int(dpi) // 10))
+    lap('binarize')
+
+    result = Image.fromarray(binary)
+    result.info['dpi'] = (dpi, dpi)
+    return result, timings
@@ -1,28 +1,97 @@
-
 # ============================================================================
 # main.py - נקודת כניסה
 # ============================================================================
 
+import argparse
+import json
+import sys
+import time
 from pathlib import Path
 from config import Config
-from ui import DisabilityAssessmentUI
+
+# ייבואים כבדים שהממשק אמור לדחות עד שימוש ראשון
+HEAVY_MODULES = ["openai", "faiss", "sentence_transformers", "torch", "pytesseract", "pypdfium2"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="מערכת הערכת נכות - ביטוח לאומי")
+    parser.add_argument("--batch", type=Path, metavar="ROOT",
+                        help="הרצה ללא ממשק: תיקייה שכל תת-תיקייה בה היא מטופל")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="תיקיית פלט ל-batch (ברירת מחדל: output/batch_<תאריך>)")
+    parser.add_argument("--workers", type=int, default=Config.BATCH_CONCURRENCY,
+                        help="מטופלים שמעובדים במקביל")
+    parser.add_argument("--force", action="store_true",
+                        help="לחלץ מחדש את כל הקבצים גם אם לא השתנו מהריצה הקודמת")
+    parser.add_argument("--regrade", action="store_true", default=Config.GRADING_MEMO_REFRESH,
+                        help="לדרג מחדש את כל האיברים ולהתעלם מתוצאות שמורות ב-memo")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="מודד זמן ייבוא של הממשק וזמן עד ש-RAG מוכן, בלי לפתוח חלון")
+    return parser.parse_args()
+
+
+def run_batch(args) -> int:
+    """הרצה על שרת - בלי Tkinter ובלי שאלות"""
+    from datetime import datetime
+    from batch_runner import BatchRunner
+
+    if not args.batch.is_dir():
+        print(f" תיקייה לא נמצאה: {args.batch}")
+        return 2
+
+    if not Path(Config.TESSERACT_PATH).exists():
+        print(f"  Tesseract לא נמצא ב-{Config.TESSERACT_PATH} - מסמכים סרוקים ייכשלו")
+
+    output_root = args.output or Config.OUTPUT_DIR / f"batch_{datetime.now():%Y%m%d_%H%M%S}"
+    runner = BatchRunner(workers=args.workers, incremental=not args.force, refresh_grading=args.regrade)
+    summary = runner.run(args.batch, output_root)
+
+    if not summary['patients']:
+        return 2
+    return 1 if summary['failed'] else 0
+
+
+def profile_startup() -> int:
+    """זמן ייבוא ui.py וזמן עד ש-RAG, המודל וה-client מוכנים (כמו ה-prewarm של הממשק)"""
+    started = time.perf_counter()
+    import ui  # noqa: F401
+    import_sec = time.perf_counter() - started
+    loaded_heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    from pipeline import PatientPipeline
+    ready_sec = PatientPipeline().prewarm()
+
+    print(json.dumps({
+        'ui_import_sec': round(import_sec, 3),
+        'heavy_modules_loaded_at_import': loaded_heavy,
+        'prewarm_sec': round(ready_sec, 3),
+        'time_to_ready_sec': round(time.perf_counter() - started, 3),
+    }, indent=2))
+    return 0
 
 
 def main():
     """נקודת כניסה"""
-    
+    args = parse_args()
+
     if not Config.OPENAI_API_KEY:
         print(" חסר API Key של OpenAI!")
         print("צור קובץ .env עם:")
         print("OPENAI_API_KEY=your-key-here")
-        return
-    
+        return 2
+
     if not Config.RAG_FILE.exists():
         print(f" קובץ RAG לא נמצא ב:")
         print(f"   {Config.RAG_FILE}")
         print("\nוודא שהנתיב נכון ב-config.py")
-        return
-    
+        return 2
+
+    if args.startup_profile:
+        return profile_startup()
+
+    if args.batch:
+        return run_batch(args)
+
     if not Path(Config.TESSERACT_PATH).exists():
         print("  Tesseract לא נמצא!")
         print(f"עדכן את הנתיב ב-config.py או התקן מ:")
@@ -30,17 +99,17 @@ def main():
         response = input("\nלהמשיך בכל זאת? (y/n): ")
         if response.lower() != 'y':
             return
-    
+
     print("\n" + "="*70)
     print("🏥 מערכת הערכת נכות - ביטוח לאומי".center(70))
     print("="*70 + "\n")
-    
+
+    # Tkinter נטען רק כשבאמת פותחים את הממשק (בשרת אין תצוגה)
+    from ui import DisabilityAssessmentUI
     ui = DisabilityAssessmentUI()
     ui.run()
 
 
 if __name__ == "__main__":
     print("התחלת התוכנית...\n")
-    main()
-
-
+    sys.exit(main())
@@ -4,23 +4,119 @@
 # medical_extractor.py - חילוץ JSON (מתוקן)
 # ============================================================================
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
+import hashlib
 import json
 import logging
 from pathlib import Path
+import os
+import queue
+import re
+import threading
 import time
-from typing import Any, List
+from typing import Any, Dict, List
 
+import metrics
 from openai_client import OpenAIClient
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _ExtractionManifest:
+    """
+    extraction_manifest.json בתיקיית הפלט: לכל קובץ txt - ה-hash שלו וה-hash של ה-_extracted.json שנוצר ממנו.
+    בהרצה חוזרת קובץ שלא השתנה נטען מה-JSON הקיים במקום קריאה חוזרת ל-GPT.
+    settings - טביעת אצבע של ה-prompt/מודל/פיצול; כשהיא משתנה כל הרשומות נפסלות.
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, path: Path, settings: str):
+        self.path = path
+        self.settings = settings
+        self.files: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+    
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"manifest פגום ({self.path.name}), מחלץ הכל מחדש: {e}")
+            return
+        if data.get('version') != self.VERSION or data.get('settings') != self.settings:
+            logging.info("הגדרות החילוץ השתנו - מחלץ הכל מחדש")
+            return
+        self.files = data.get('files', {})
+    
+    def cached_result(self, txt_name: str, txt_hash: str, output_file: Path) -> dict:
+        """התוצאה השמורה אם הקובץ לא השתנה וה-JSON שלו שלם, אחרת None"""
+        entry = self.files.get(txt_name)
+        if not entry or entry.get('txt_sha256') != txt_hash or not output_file.exists():
+            return None
+        try:
+            if _file_sha256(output_file) != entry.get('json_sha256'):
+                return None
+            with open(output_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def record(self, txt_name: str, txt_hash: str, output_file: Path, status: str):
+        with self._lock:
+            self.files[txt_name] = {
+                'txt_sha256': txt_hash,
+                'extracted': output_file.name,
+                'json_sha256': _file_sha256(output_file),
+                'status': status,
+                'updated_at': datetime.now().isoformat()
+            }
+            self._save()
+    
+    def prune(self, txt_names: List[str]):
+        """מוחק רשומות של קבצי txt שכבר לא קיימים"""
+        with self._lock:
+            self.files = {name: entry for name, entry in self.files.items() if name in txt_names}
+            self._save()
+    
+    def _save(self):
+        # כתיבה לקובץ זמני והחלפה - הפסקה באמצע לא משאירה manifest חלקי
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'settings': self.settings, 'files': self.files},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
 class MedicalJSONExtractor:
     """מחלץ מידע רפואי עם retry"""
     
-    def __init__(self, openai_client: OpenAIClient):
+    # שדות הרשימה בתוצאת החילוץ שמאחדים בין מקטעים
+    LIST_FIELDS = ['diagnoses', 'treatments', 'surgeries', 'medical_tests', 'functional_limitations']
+    MANIFEST_NAME = "extraction_manifest.json"
+    
+    def __init__(self, openai_client: OpenAIClient, max_workers: int = 1, chunk_size: int = None):
         self.ai = openai_client
+        # מספר קריאות GPT במקביל (ה-client של OpenAI בטוח לשימוש מכמה threads)
+        self.max_workers = max(1, max_workers or 1)
+        # כל קריאות ה-GPT של ה-extractor - קבצים ומקטעים של קובץ ארוך שרץ בתוך ה-pool של הקבצים -
+        # עוברות באותן max_workers משבצות, כך שהמקבילות לא מוכפלת
+        self._call_slots = threading.BoundedSemaphore(self.max_workers)
+        # מסמך ארוך מ-chunk_size תווים מחולץ במקטעים (None = תמיד בקריאה אחת)
+        self.chunk_size = chunk_size
         self.extraction_prompt = self._build_extraction_prompt()
     
     def _build_extraction_prompt(self) -> str:
@@ -75,21 +171,28 @@ class MedicalJSONExtractor:
             logging.warning(f"קובץ {file_path.name} קצר מדי או ריק")
             return self._create_empty_result(file_path.name, "Empty file")
         
-        # ניסיון עיבוד
+        if self.chunk_size and len(content) > self.chunk_size:
+            return self._extract_chunked(content, file_path.name)
+        
+        return self._extract_text(content, file_path.name)
+    
+    def _extract_text(self, content: str, filename: str) -> dict:
+        """קריאת GPT אחת (עם retry) על טקסט נתון"""
         for attempt in range(2):
             try:
                 full_prompt = self.extraction_prompt + "\n\nתיעוד רפואי:\n\n" + content
                 
-                response = self.ai.call(
-                    prompt=full_prompt,
-                    system_prompt="אתה מומחה רפואי משפטי לניתוח תיעוד רפואי.",
-                    response_format={"type": "json_object"},
-                    temperature=0.1
-                )
+                with self._call_slots:
+                    response = self.ai.call(
+                        prompt=full_prompt,
+                        system_prompt="אתה מומחה רפואי משפטי לניתוח תיעוד רפואי.",
+                        response_format={"type": "json_object"},
+                        temperature=0.1
+                    )
                 
                 result = json.loads(response)
                 result['file_metadata'] = {
-                    'filename': file_path.name,
+                    'filename': filename,
                     'processing_date': datetime.now().isoformat(),
                     'status': 'success'
                 }
@@ -99,48 +202,234 @@ class MedicalJSONExtractor:
             except json.JSONDecodeError as e:
                 logging.warning(f"    נסיון {attempt+1}: JSON לא תקין - {e}")
                 if attempt == 1:
-                    return self._create_empty_result(file_path.name, f"JSON decode failed: {e}")
+                    return self._create_empty_result(filename, f"JSON decode failed: {e}")
                 time.sleep(1)
                 
             except Exception as e:
                 logging.error(f"   נסיון {attempt+1}: {e}")
                 if attempt == 1:
-                    return self._create_empty_result(file_path.name, str(e))
+                    return self._create_empty_result(filename, str(e))
                 time.sleep(1)
         
-        return self._create_empty_result(file_path.name, "All retries failed")
+        return self._create_empty_result(filename, "All retries failed")
+    
+    def _extract_chunked(self, content: str, filename: str) -> dict:
+        """
+        map-reduce: חילוץ מכל מקטע בנפרד (במקביל, בתוך משבצות הקריאה המשותפות) ואיחוד הרשימות
+        למבנה התוצאה הרגיל, בלי כפילויות
+        """
+        chunks = self._split_into_chunks(content, self.chunk_size)
+        metrics.current().increment('extraction_chunks', len(chunks))
+        logging.info(f"    {filename}: מסמך ארוך ({len(content)} תווים) - מחולץ ב-{len(chunks)} מקטעים")
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+            partials = list(pool.map(metrics.propagate(lambda chunk: self._extract_text(chunk, filename)), chunks))
+        
+        succeeded = [p for p in partials if p.get('file_metadata', {}).get('status') == 'success']
+        if not succeeded:
+            errors = "; ".join(p['file_metadata'].get('error', '') for p in partials)
+            return self._create_empty_result(filename, f"All chunks failed: {errors}")
+        
+        merged = {field: self._merge_items(field, [p.get(field, []) for p in succeeded])
+                  for field in self.LIST_FIELDS}
+        merged['file_metadata'] = {
+            'filename': filename,
+            'processing_date': datetime.now().isoformat(),
+            'status': 'success',
+            'chunks': len(chunks),
+            'failed_chunks': len(chunks) - len(succeeded)
+        }
+        
+        return self._clean_nulls(merged)
+    
+    def _split_into_chunks(self, content: str, max_size: int) -> List[str]:
+        """
+        מפצל על גבולות עמוד/פסקה (שורה ריקה), ומאחד פסקאות עד max_size.
+        פסקה ארוכה מדי מפוצלת לפי שורות, ושורה ארוכה מדי - לפי תווים.
+        """
+        pieces = []
+        for block in re.split(r'\n\s*\n', content):
+            block = block.strip()
+            if not block:
+                continue
+            if len(block) <= max_size:
+                pieces.append(block)
+                continue
+            for line in block.splitlines():
+                for start in range(0, len(line), max_size):
+                    pieces.append(line[start:start + max_size])
+        
+        chunks = []
+        current = ""
+        for piece in pieces:
+            if current and len(current) + 2 + len(piece) > max_size:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+        if current:
+            chunks.append(current)
+        
+        return chunks
+    
+    def _merge_items(self, field: str, lists: List[list]) -> list:
+        """
+        מאחד רשימות ממקטעים שונים ומסיר כפילויות.
+        אבחנות מזוהות לפי איבר+מצב (הגרסה המפורטת יותר נשמרת), השאר לפי תוכן זהה.
+        """
+        merged = []
+        positions = {}
+        
+        for items in lists:
+            for item in items:
+                key = self._dedup_key(field, item)
+                if key not in positions:
+                    positions[key] = len(merged)
+                    merged.append(item)
+                elif len(json.dumps(item, ensure_ascii=False)) > len(json.dumps(merged[positions[key]], ensure_ascii=False)):
+                    merged[positions[key]] = item
+        
+        return merged
+    
+    def _dedup_key(self, field: str, item: Any) -> str:
+        def norm(value) -> str:
+            return re.sub(r'\s+', ' ', str(value or '')).strip().lower()
+        
+        if field == 'diagnoses' and isinstance(item, dict):
+            condition = item.get('condition_medical_term') or item.get('condition_hebrew')
+            if condition:
+                return f"{norm(item.get('body_part'))}|{norm(condition)}"
+        
+        if isinstance(item, str):
+            return norm(item)
+        return json.dumps(item, ensure_ascii=False, sort_keys=True)
     
-    def extract_from_directory(self, directory: Path, output_dir: Path) -> dict:
-        """מעבד תיקייה"""
+    def extract_from_directory(self, directory: Path, output_dir: Path, incremental: bool = True) -> dict:
+        """
+        מעבד תיקייה. incremental - קבצים שה-hash שלהם לא השתנה מאז הריצה הקודמת
+        נטענים מה-_extracted.json הקיים, ורק קבצים חדשים/ששונו נשלחים ל-GPT
+        """
         txt_files = sorted(directory.glob("*.txt"))
         
         if not txt_files:
             logging.error(f"לא נמצאו קבצי TXT ב-{directory}")
             return {}
         
-        logging.info(f"מעבד {len(txt_files)} קבצים...\n")
+        manifest = _ExtractionManifest(output_dir / self.MANIFEST_NAME, self._settings_fingerprint())
+        if incremental:
+            manifest.load()
         
-        all_results = []
-        successful = 0
-        failed = 0
+        # התוצאות נשמרות לפי מיקום הקובץ, כך שהאיחוד דטרמיניסטי גם כשהסיום לא לפי הסדר
+        all_results: List[dict] = [None] * len(txt_files)
+        hashes = [_file_sha256(file_path) for file_path in txt_files]
         
-        for i, file_path in enumerate(txt_files, 1):
-            logging.info(f"[{i}/{len(txt_files)}]")
-            result = self.extract_from_file(file_path)
-            
-            if result.get('file_metadata', {}).get('status') == 'success':
-                successful += 1
+        pending = []
+        for i, file_path in enumerate(txt_files):
+            cached = self._reusable_result(manifest, file_path, hashes[i], output_dir)
+            if cached is not None:
+                all_results[i] = cached
             else:
-                failed += 1
-            
-            all_results.append(result)
+                pending.append(i)
+        
+        reused = len(txt_files) - len(pending)
+        if reused:
+            logging.info(f"{reused} קבצים לא השתנו - נטענים מתוצאות קודמות")
+        logging.info(f"מעבד {len(pending)} קבצים...\n")
+        
+        if self.max_workers > 1 and len(pending) > 1:
+            logging.info(f"חילוץ מקבילי: עד {self.max_workers} קריאות בו-זמנית")
+            extract_and_save = metrics.propagate(self._extract_and_save)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {
+                    pool.submit(extract_and_save, txt_files[i], output_dir, manifest, hashes[i]): i
+                    for i in pending
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    i = futures[future]
+                    all_results[i] = future.result()
+                    logging.info(f"[{done}/{len(pending)}] הסתיים: {txt_files[i].name}")
+        else:
+            for done, i in enumerate(pending, 1):
+                logging.info(f"[{done}/{len(pending)}]")
+                all_results[i] = self._extract_and_save(txt_files[i], output_dir, manifest, hashes[i])
+        
+        return self._finish(txt_files, all_results, manifest, output_dir, reused)
+    
+    def extract_stream(self, txt_queue: queue.Queue, directory: Path, output_dir: Path,
+                       incremental: bool = True) -> dict:
+        """
+        חילוץ תוך כדי OCR: כל קובץ TXT שמגיע בתור (None מסמן סוף) נשלח לחילוץ מיד.
+        כשכל ה-workers עסוקים לא נשלף קובץ נוסף מהתור, וכך תור חסום עוצר גם את ה-OCR.
+        בסוף נאספים גם קבצי TXT שכבר היו בתיקייה, כך שהאיחוד זהה ל-extract_from_directory.
+        """
+        manifest = _ExtractionManifest(output_dir / self.MANIFEST_NAME, self._settings_fingerprint())
+        if incremental:
+            manifest.load()
+        
+        results: Dict[str, dict] = {}
+        in_flight = {}
+        done_count = 0
+        
+        def collect(futures):
+            nonlocal done_count
+            for future in futures:
+                file_path = in_flight.pop(future)
+                results[file_path.name] = future.result()
+                done_count += 1
+                logging.info(f"[{done_count}] הסתיים: {file_path.name}")
+        
+        def submit(file_path: Path):
+            if file_path.name in results or any(path.name == file_path.name for path in in_flight.values()):
+                return
+            txt_hash = _file_sha256(file_path)
+            cached = self._reusable_result(manifest, file_path, txt_hash, output_dir)
+            if cached is not None:
+                results[file_path.name] = cached
+                return
+            while len(in_flight) >= self.max_workers:
+                finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                collect(finished)
+            in_flight[pool.submit(extract_and_save, file_path, output_dir, manifest, txt_hash)] = file_path
+        
+        extract_and_save = metrics.propagate(self._extract_and_save)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                file_path = txt_queue.get()
+                if file_path is None:
+                    break
+                submit(Path(file_path))
             
-            # שמירה בודדת
-            output_file = output_dir / f"{file_path.stem}_extracted.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            for file_path in sorted(directory.glob("*.txt")):
+                submit(file_path)
+            collect(list(as_completed(list(in_flight))))
+        
+        if not results:
+            logging.error(f"לא נמצאו קבצי TXT ב-{directory}")
+            return {}
+        
+        txt_files = sorted(directory / name for name in results)
+        all_results = [results[file_path.name] for file_path in txt_files]
+        reused = len(txt_files) - done_count
+        return self._finish(txt_files, all_results, manifest, output_dir, reused)
+    
+    def _reusable_result(self, manifest: _ExtractionManifest, file_path: Path, txt_hash: str,
+                         output_dir: Path) -> dict:
+        """התוצאה מהריצה הקודמת אם הקובץ לא השתנה והחילוץ שלו הצליח, אחרת None"""
+        cached = manifest.cached_result(file_path.name, txt_hash, self._output_file(file_path, output_dir))
+        if cached is not None and cached.get('file_metadata', {}).get('status') == 'success':
+            metrics.current().increment('extraction_manifest_hits')
+            return cached
+        metrics.current().increment('extraction_manifest_misses')
+        return None
+    
+    def _finish(self, txt_files: List[Path], all_results: List[dict], manifest: _ExtractionManifest,
+                output_dir: Path, reused: int) -> dict:
+        """ניקוי ה-manifest, איחוד ושמירת הקובץ המאוחד"""
+        manifest.prune([file_path.name for file_path in txt_files])
+        
+        successful = sum(1 for r in all_results if r.get('file_metadata', {}).get('status') == 'success')
+        failed = len(all_results) - successful
         
-        # איחוד
+        # איחוד - תמיד נבנה מחדש מהתוצאות של כל הקבצים, גם אלה שנטענו מהריצה הקודמת
         consolidated = self._consolidate_results(all_results)
         
         consolidated_file = output_dir / "all_medical_data_consolidated.json"
@@ -148,12 +437,45 @@ class MedicalJSONExtractor:
             json.dump(consolidated, f, ensure_ascii=False, indent=2)
         
         logging.info(f"\n חילוץ הושלם:")
-        logging.info(f"  • הצליחו: {successful}/{len(txt_files)}")
+        logging.info(f"  • הצליחו: {successful}/{len(txt_files)} ({reused} מתוצאות קודמות)")
         logging.info(f"  • נכשלו: {failed}/{len(txt_files)}")
         logging.info(f"  • נשמר ב: {consolidated_file}\n")
         
         return consolidated
     
+    def _extract_and_save(self, file_path: Path, output_dir: Path,
+                          manifest: _ExtractionManifest = None, txt_hash: str = None) -> dict:
+        """מחלץ קובץ בודד ושומר את ה-JSON שלו מיד כשהוא מוכן"""
+        started = time.perf_counter()
+        try:
+            result = self.extract_from_file(file_path)
+        except Exception as e:
+            logging.error(f"   {file_path.name}: {e}")
+            result = self._create_empty_result(file_path.name, str(e))
+        
+        # שמירה בודדת
+        output_file = self._output_file(file_path, output_dir)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        
+        if manifest is not None:
+            manifest.record(file_path.name, txt_hash, output_file, result.get('file_metadata', {}).get('status'))
+        
+        metrics.current().record_item('extraction', file_path.name, time.perf_counter() - started)
+        return result
+    
+    def _output_file(self, file_path: Path, output_dir: Path) -> Path:
+        return output_dir / f"{file_path.stem}_extracted.json"
+    
+    def _settings_fingerprint(self) -> str:
+        """כל מה שמשפיע על תוצאת החילוץ מלבד הטקסט עצמו"""
+        parts = {
+            'prompt': self.extraction_prompt,
+            'model': getattr(self.ai, 'model', None),
+            'chunk_size': self.chunk_size
+        }
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+    
     def _consolidate_results(self, results: List[dict]) -> dict:
         consolidated = {
             'metadata': {
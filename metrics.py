@@ -0,0 +1,240 @@
+# ============================================================================
+# metrics.py - מדדי ריצה: זמנים, טוקנים, עלות ו-cache
+# ============================================================================
+
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import logging
+from pathlib import Path
+import sys
+import threading
+import time
+from typing import Dict, List
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+
+def peak_rss_mb() -> dict:
+    """שיא RSS של התהליך ושל תהליכי הבן (OCR מקבילי). לא זמין ב-Windows"""
+    try:
+        import resource
+    except ImportError:
+        return {'self': None, 'children': None}
+    
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+        'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor, 1),
+    }
+
+
+class MetricsRecorder:
+    """
+    אוסף מדדים לריצה אחת (מטופל אחד). בטוח לשימוש מכמה threads.
+    stages - זמן קיר לכל שלב; items - זמן לכל קובץ/איבר בתוך שלב;
+    counters - מונים (עמודים, פגיעות cache...); samples - תצפיות (זמן שאילתת RAG).
+    parent - recorder שמקבל גם הוא כל מדד (מטופל בתוך ריצת batch).
+    """
+    
+    def __init__(self, pricing: Dict[str, tuple] = None, parent: "MetricsRecorder" = None):
+        # pricing: מודל -> (דולר למיליון טוקני prompt, דולר למיליון טוקני completion)
+        self.pricing = pricing or {}
+        self.parent = parent
+        self.started_at = datetime.now().isoformat()
+        self.stages: Dict[str, float] = {}
+        self.items: Dict[str, Dict[str, float]] = {}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+        self.counters: Dict[str, float] = {}
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+    
+    def record_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if self.parent is not None:
+            self.parent.record_stage(name, seconds)
+    
+    def record_item(self, stage: str, item: str, seconds: float):
+        with self._lock:
+            self.items.setdefault(stage, {})[item] = round(seconds, 3)
+        if self.parent is not None:
+            self.parent.record_item(stage, item, seconds)
+    
+    def record_tokens(self, model: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            usage = self.tokens.setdefault(model, {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            usage['calls'] += 1
+            usage['prompt_tokens'] += prompt_tokens or 0
+            usage['completion_tokens'] += completion_tokens or 0
+        if self.parent is not None:
+            self.parent.record_tokens(model, prompt_tokens, completion_tokens)
+    
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        if self.parent is not None:
+            self.parent.increment(name, value)
+    
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self.samples.setdefault(name, []).append(value)
+        if self.parent is not None:
+            self.parent.observe(name, value)
+    
+    def snapshot(self) -> dict:
+        """כל המדדים + מדדים נגזרים (עמודים לשנייה, אחוזי פגיעה, אחוזונים, עלות)"""
+        with self._lock:
+            counters = dict(self.counters)
+            tokens = {model: dict(usage) for model, usage in self.tokens.items()}
+            stages = {name: round(seconds, 3) for name, seconds in self.stages.items()}
+            items = {stage: dict(values) for stage, values in self.items.items()}
+            samples = {name: list(values) for name, values in self.samples.items()}
+        
+        derived = {}
+        ocr_pages = counters.get('ocr_pages_tesseract', 0) + counters.get('ocr_pages_text_layer', 0)
+        if ocr_pages and stages.get('ocr'):
+            derived['ocr_pages_per_second'] = round(ocr_pages / stages['ocr'], 3)
+        
+        for cache in ('llm_cache', 'ocr_cache', 'rag_cache', 'extraction_manifest', 'grading_memo'):
+            hits, misses = counters.get(f'{cache}_hits', 0), counters.get(f'{cache}_misses', 0)
+            if hits + misses:
+                derived[f'{cache}_hit_rate'] = round(hits / (hits + misses), 3)
+        
+        if counters.get('rag_contexts'):
+            derived['rag_context_tokens_per_query'] = round(counters.get('rag_context_tokens', 0) / counters['rag_contexts'], 1)
+        
+        latencies = {name: self._summarize(values) for name, values in samples.items() if values}
+        
+        total_cost = 0.0
+        for model, usage in tokens.items():
+            prompt_price, completion_price = self.pricing.get(model, (0.0, 0.0))
+            usage['cost_usd'] = round(
+                usage['prompt_tokens'] / 1e6 * prompt_price + usage['completion_tokens'] / 1e6 * completion_price, 4
+            )
+            total_cost += usage['cost_usd']
+        
+        return {
+            'started_at': self.started_at,
+            'finished_at': datetime.now().isoformat(),
+            'stages_sec': stages,
+            'items_sec': items,
+            'tokens': tokens,
+            'total_cost_usd': round(total_cost, 4),
+            'counters': counters,
+            'latency_sec': latencies,
+            'derived': derived,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+    
+    def write_json(self, path: Path) -> dict:
+        snapshot = self.snapshot()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        return snapshot
+    
+    def write_prometheus(self, path: Path, prefix: str = "docanalyzer"):
+        """קובץ בפורמט טקסט של Prometheus ל-textfile collector של node exporter"""
+        snapshot = self.snapshot()
+        lines = []
+        
+        def metric(name: str, kind: str, samples: List[tuple]):
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{self._escape(v)}"' for k, v in labels.items())
+                lines.append(f"{prefix}_{name}{{{label_text}}} {value}" if label_text else f"{prefix}_{name} {value}")
+        
+        metric("stage_seconds", "gauge", [({'stage': s}, v) for s, v in snapshot['stages_sec'].items()])
+        metric("tokens_total", "counter", [
+            ({'model': model, 'type': kind}, usage[f'{kind}_tokens'])
+            for model, usage in snapshot['tokens'].items() for kind in ('prompt', 'completion')
+        ])
+        metric("cost_usd", "gauge", [({}, snapshot['total_cost_usd'])])
+        for name, value in snapshot['counters'].items():
+            metric(f"{name}_total", "counter", [({}, value)])
+        for name, summary in snapshot['latency_sec'].items():
+            metric(name, "summary", [({'quantile': '0.5'}, summary['p50']), ({'quantile': '0.95'}, summary['p95'])])
+            lines.append(f"{prefix}_{name}_sum {summary['sum']}")
+            lines.append(f"{prefix}_{name}_count {summary['count']}")
+        for name, value in snapshot['derived'].items():
+            metric(name, "gauge", [({}, value)])
+        
+        # כתיבה לקובץ זמני והחלפה, כדי שה-collector לא יקרא קובץ חלקי
+        tmp_path = Path(f"{path}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        tmp_path.replace(path)
+    
+    @staticmethod
+    def _summarize(values: List[float]) -> dict:
+        ordered = sorted(values)
+        
+        def pct(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 4)
+        
+        return {
+            'count': len(ordered),
+            'sum': round(sum(ordered), 4),
+            'mean': round(sum(ordered) / len(ordered), 4),
+            'p50': pct(0.5),
+            'p95': pct(0.95),
+            'max': round(ordered[-1], 4),
+        }
+    
+    @staticmethod
+    def _escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_current = MetricsRecorder()
+_current_lock = threading.Lock()
+# recorder של מטופל, לכל thread בנפרד (מטופלים שרצים במקביל ב-batch)
+_bound = threading.local()
+
+
+def current() -> MetricsRecorder:
+    """ה-recorder שקשור ל-thread הנוכחי (ראה bound), אחרת זה של הריצה הנוכחית בתהליך"""
+    return getattr(_bound, 'recorder', None) or _current
+
+
+@contextmanager
+def bound(recorder: MetricsRecorder):
+    """בתוך הבלוק current() ב-thread הזה מחזיר את recorder"""
+    previous = getattr(_bound, 'recorder', None)
+    _bound.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _bound.recorder = previous
+
+
+def propagate(fn):
+    """
+    עוטף פונקציה שתרוץ ב-thread אחר (pool, thread רקע) כך שתרשום ל-recorder
+    של ה-thread שיצר אותה - threads חדשים לא יורשים את bound.
+    """
+    recorder = current()
+
+    def run(*args, **kwargs):
+        with bound(recorder):
+            return fn(*args, **kwargs)
+    return run
+
+
+def start_run(pricing: Dict[str, tuple] = None) -> MetricsRecorder:
+    """מתחיל ריצה חדשה (מטופל חדש) - כל המדדים מכאן נרשמים ל-recorder חדש"""
+    global _current
+    with _current_lock:
+        _current = MetricsRecorder(pricing)
+        return _current
@@ -0,0 +1,65 @@
+# ============================================================================
+# ocr_cache.py - cache תוצאות OCR לפי תוכן הקובץ
+# ============================================================================
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import uuid
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+class OCRCache:
+    """
+    cache של טקסט OCR לפי hash של תוכן הקובץ + הגדרות ה-OCR.
+    אותו פקס בשני שמות מזוהה פעם אחת, וסריקה מתוקנת באותו שם מזוהה מחדש.
+    הכתיבה אטומית (קובץ זמני + os.replace) כך שאפשר לשתף את התיקייה
+    בין מטופלים ובין מחשבים על NFS.
+    """
+    
+    FORMAT_VERSION = 1
+    
+    def __init__(self, cache_dir: Path, settings: dict):
+        self.cache_dir = Path(cache_dir)
+        self.settings = dict(settings, format_version=self.FORMAT_VERSION)
+        self._settings_blob = json.dumps(self.settings, sort_keys=True).encode('utf-8')
+    
+    def key_for(self, file_path: Path) -> str:
+        """sha256 של בתי הקובץ ושל ההגדרות"""
+        digest = hashlib.sha256()
+        digest.update(self._settings_blob)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> str:
+        """מחזיר את הטקסט השמור או None"""
+        try:
+            with open(self._path_for(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.warning(f"קריאה מ-cache OCR נכשלה: {e}")
+            return None
+    
+    def put(self, key: str, text: str):
+        path = self._path_for(key)
+        tmp_path = path.with_name(f".{key}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"שמירה ל-cache OCR נכשלה: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+    
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.txt"
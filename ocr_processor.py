@@ -3,27 +3,236 @@
 # ocr_processor.py - עיבוד OCR (מתוקן)
 # ============================================================================
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
 import logging
+import math
+import os
 from pathlib import Path
-from typing import List, Tuple
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
 import pytesseract
 import pypdfium2 as pdfium
 from PIL import Image
 import shutil
 
+import image_preprocessing
+import metrics
+from ocr_cache import OCRCache
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
+# pdfium אינו thread-safe, ומטופלים ב-batch רצים ב-threads של אותו תהליך, כל אחד עם OCRProcessor משלו -
+# כל שימוש ב-pdfium בתהליך (פתיחה, ספירה, רינדור, סגירה) עובר דרך המנעול הזה
+_PDFIUM_LOCK = threading.RLock()
+
+
+# ----------------------------------------------------------------------------
+# פונקציות worker - ברמת המודול כדי שיהיו ניתנות ל-pickle ב-ProcessPoolExecutor
+# ----------------------------------------------------------------------------
+
+def _init_worker(tesseract_path: str):
+    """מאתחל תהליך worker (ב-Windows כל תהליך מתחיל נקי)"""
+    if tesseract_path:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_path
+
+
+def _text_layer(page, min_chars: int) -> str:
+    """
+    מחזיר את שכבת הטקסט של העמוד אם יש בה מספיק תווים (PDF דיגיטלי),
+    או None אם העמוד הוא תמונה בלבד ויש להריץ עליו OCR.
+    """
+    if min_chars <= 0:
+        return None
+    
+    textpage = page.get_textpage()
+    try:
+        text = textpage.get_text_bounded()
+    finally:
+        textpage.close()
+    
+    if sum(1 for ch in text if ch.isalnum()) < min_chars:
+        return None
+    return text
+
+
+def _render_page(page, scale: float, max_pixels: int = None, grayscale: bool = False):
+    """
+    מרנדר עמוד לתמונה. max_pixels - תקרת פיקסלים: עמוד גדול מרונדר ב-scale קטן יותר.
+    מחזיר (תמונת PIL, bitmap) - בגווני אפור התמונה משתפת את הזיכרון של ה-bitmap,
+    ולכן סוגרים את שניהם רק בסיום השימוש בתמונה, ובאותו thread שרינדר (ראה _close_rendered).
+    """
+    if max_pixels:
+        width, height = page.get_size()
+        scale = min(scale, math.sqrt(max_pixels / max(width * height, 1.0)))
+    bitmap = page.render(scale=scale, grayscale=grayscale)
+    image = bitmap.to_pil()
+    image.info['dpi'] = (72 * scale, 72 * scale)  # PDF מוגדר ב-72 נקודות לאינץ'
+    return image, bitmap
+
+
+def _close_rendered(rendered):
+    image, bitmap = rendered
+    image.close()
+    bitmap.close()
+
+
+def _recognize(image: Image.Image, languages: str, preprocess_dpi: int = None) -> Tuple[str, Dict[str, float]]:
+    """
+    tesseract על תמונה, עם עיבוד מקדים אופציונלי (preprocess_dpi - DPI היעד; None = בלי).
+    מחזיר (טקסט, זמן כל שלב בשניות) - תמיד כולל 'tesseract'.
+    """
+    timings = {}
+    if preprocess_dpi:
+        image, steps = image_preprocessing.preprocess(image, preprocess_dpi)
+        timings = {f'preprocess_{step}': seconds for step, seconds in steps.items()}
+    started = time.perf_counter()
+    try:
+        text = pytesseract.image_to_string(image, lang=languages)
+    finally:
+        if preprocess_dpi:
+            image.close()
+    timings['tesseract'] = time.perf_counter() - started
+    return text, timings
+
+
+def _record_page_timings(timings: Dict[str, float]):
+    """זמני השלבים של עמוד שעבר OCR, כדי להשוות זמן לעמוד עם ובלי עיבוד מקדים"""
+    recorder = metrics.current()
+    for step, seconds in timings.items():
+        recorder.observe(f'ocr_{step}_seconds', seconds)
+    recorder.observe('ocr_page_seconds', sum(timings.values()))
+
+
+def _ocr_pdf_page(pdf_path: str, page_num: int, languages: str, scale: float,
+                  text_layer_min_chars: int = 0, max_pixels: int = None,
+                  grayscale: bool = False, preprocess_dpi: int = None) -> Tuple[str, str, Dict[str, float]]:
+    """OCR לעמוד בודד ב-PDF. מחזיר (טקסט, 'text_layer'/'ocr', זמני השלבים)"""
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        page = pdf[page_num]
+        try:
+            text = _text_layer(page, text_layer_min_chars)
+            if text is not None:
+                return text, 'text_layer', {}
+            
+            rendered = _render_page(page, scale, max_pixels, grayscale)
+            try:
+                text, timings = _recognize(rendered[0], languages, preprocess_dpi)
+                return text, 'ocr', timings
+            finally:
+                _close_rendered(rendered)
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+
+
+def _ocr_image_file(image_path: str, languages: str, preprocess_dpi: int = None) -> Tuple[str, str, Dict[str, float]]:
+    """OCR לקובץ תמונה"""
+    with Image.open(image_path) as image:
+        text, timings = _recognize(image, languages, preprocess_dpi)
+    return text, 'ocr', timings
+
+
+class _PageCheckpoint:
+    """
+    checkpoint לעמודים שהסתיימו: שורת כותרת ואחריה שורת JSON לכל עמוד.
+    כל עמוד נכתב לדיסק מיד, כך שקריסה באמצע מסמך לא מאבדת את מה שכבר זוהה.
+    """
+    
+    def __init__(self, path: Path, source: Path):
+        self.path = path
+        stat = source.stat()
+        self.signature = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    
+    def load(self) -> Dict[int, str]:
+        """מחזיר את העמודים שכבר הושלמו (ריק אם אין checkpoint או שהקובץ השתנה)"""
+        if not self.path.exists():
+            return {}
+        
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        
+        try:
+            header = json.loads(lines[0]) if lines else None
+        except json.JSONDecodeError:
+            header = None
+        if header != self.signature:
+            self.remove()
+            return {}
+        
+        pages = {}
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # שורה אחרונה שנקטעה בקריסה - כותבים מחדש רק את מה שתקין
+                self._rewrite(pages)
+                break
+            pages[record['page']] = record['text']
+        
+        return pages
+    
+    def append(self, page_num: int, text: str):
+        new_file = not self.path.exists()
+        if new_file:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if new_file:
+                f.write(json.dumps(self.signature, ensure_ascii=False) + "\n")
+            f.write(json.dumps({'page': page_num, 'text': text}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def remove(self):
+        if self.path.exists():
+            self.path.unlink()
+    
+    def _rewrite(self, pages: Dict[int, str]):
+        self.remove()
+        for page_num, text in pages.items():
+            self.append(page_num, text)
+
+
 class OCRProcessor:
     """מעבד OCR עם retry ומעקף Netfree"""
     
-    def __init__(self, tesseract_path: str = None, languages: str = "heb+eng"):
+    def __init__(self, tesseract_path: str = None, languages: str = "heb+eng",
+                 workers: int = 1, render_scale: float = 2, pipeline_depth: int = 4,
+                 cache_dir: Path = None, use_text_layer: bool = True, text_layer_min_chars: int = 50,
+                 low_memory: bool = False, max_page_pixels: int = None,
+                 preprocess: bool = False, preprocess_dpi: int = 300):
         if tesseract_path:
             pytesseract.pytesseract.tesseract_cmd = tesseract_path
+        self.tesseract_path = tesseract_path
         self.languages = languages
+        self.workers = max(1, workers or 1)
+        self.render_scale = render_scale
+        self.pipeline_depth = max(1, pipeline_depth)
+        self.cache_dir = cache_dir
+        # 0 מבטל את המסלול המהיר וכל עמוד עובר OCR
+        self.text_layer_min_chars = text_layer_min_chars if use_text_layer else 0
+        # low_memory - לתיקים של מאות עמודים סרוקים: רינדור בגווני אפור עד max_page_pixels,
+        # עמוד מרונדר אחד בלבד ממתין בתור, והטקסט של עמודים שהסתיימו נשמר ב-checkpoint בדיסק
+        # ולא בזיכרון עד סוף הקובץ
+        self.low_memory = low_memory
+        self.max_page_pixels = max_page_pixels if low_memory else None
+        if low_memory:
+            self.pipeline_depth = 1
+        # preprocess - גווני אפור, הקטנה ל-preprocess_dpi, יישור ובינריזציה לפני tesseract (לסריקות פקס רועשות)
+        self.preprocess_dpi = preprocess_dpi if preprocess else None
+        self._cache: OCRCache = None
+        self._txt_names: Dict[Path, str] = {}
     
-    def process_directory(self, input_dir: Path, output_dir: Path = None) -> Tuple[List[Path], List[Path]]:
+    def process_directory(self, input_dir: Path, output_dir: Path = None,
+                          on_file_done: Callable[[Path], None] = None) -> Tuple[List[Path], List[Path]]:
         """
-        מעבד תיקייה שלמה עם retry
+        מעבד תיקייה שלמה עם retry.
+        on_file_done(txt_path) - נקרא לכל קובץ מיד כשה-TXT שלו נכתב (לחילוץ תוך כדי OCR)
         
         Returns:
             (רשימת קבצים שהצליחו, רשימת קבצים שנכשלו)
@@ -42,18 +251,26 @@ class OCRProcessor:
             return [], []
         
         logging.info(f"נמצאו {len(files_to_process)} קבצים לעיבוד\n")
+        self._assign_txt_names(files_to_process)
         
         successful = []
         failed = []
         
-        for i, file_path in enumerate(files_to_process, 1):
-            logging.info(f"[{i}/{len(files_to_process)}] מעבד: {file_path.name}")
-            
-            result = self._process_single_file(file_path, output_dir)
-            if result:
-                successful.append(result)
-            else:
-                failed.append(file_path)
+        if self.workers > 1:
+            successful, failed = self._process_parallel(files_to_process, output_dir, on_file_done)
+        else:
+            for i, file_path in enumerate(files_to_process, 1):
+                logging.info(f"[{i}/{len(files_to_process)}] מעבד: {file_path.name}")
+                
+                started = time.perf_counter()
+                result = self._process_single_file(file_path, output_dir)
+                metrics.current().record_item('ocr', file_path.name, time.perf_counter() - started)
+                if result:
+                    successful.append(result)
+                    if on_file_done:
+                        on_file_done(result)
+                else:
+                    failed.append(file_path)
         
         if failed:
             logging.info(f"\n מנסה שוב {len(failed)} קבצים שנכשלו...\n")
@@ -70,6 +287,8 @@ class OCRProcessor:
                 if result:
                     successful.append(result)
                     failed.remove(file_path)
+                    if on_file_done:
+                        on_file_done(result)
                     logging.info(f"  ✓ הצליח בנסיון שני!\n")
                 else:
                     logging.error(f"  ✗ נכשל גם בנסיון שני\n")
@@ -85,30 +304,250 @@ class OCRProcessor:
         
         return successful, failed
     
+    def _process_parallel(self, files: List[Path], output_dir: Path,
+                          on_file_done: Callable[[Path], None] = None) -> Tuple[List[Path], List[Path]]:
+        """
+        מפזר את העבודה ברמת (קובץ, עמוד) על פני תהליכים.
+        כל עמוד חוזר למקומו לפי מספרו, והקובץ נכתב רק כשכל עמודיו הסתיימו.
+        קבצים שנכשלו חוזרים לנסיון השני הרגיל (כולל העתק זמני).
+        """
+        logging.info(f"OCR מקבילי עם {self.workers} תהליכים")
+        
+        results: Dict[Path, Path] = {}
+        failed_set = set()
+        page_texts: Dict[Path, Dict[int, str]] = {}
+        page_counts: Dict[Path, int] = {}
+        page_methods: Dict[Path, Dict[str, int]] = {}
+        checkpoints: Dict[Path, _PageCheckpoint] = {}
+        cache_keys: Dict[Path, str] = {}
+        started: Dict[Path, float] = {}
+        file_futures: Dict[Path, list] = {}
+        futures = {}
+        cache = self._cache_for(output_dir)
+        
+        def finished(file_path: Path, txt_path: Path):
+            results[file_path] = txt_path
+            if on_file_done:
+                on_file_done(txt_path)
+        
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.tesseract_path,)) as pool:
+            for file_path in files:
+                started[file_path] = time.perf_counter()
+                try:
+                    cache_keys[file_path] = cache.key_for(file_path)
+                    cached = cache.get(cache_keys[file_path])
+                    if cached is not None:
+                        metrics.current().increment('ocr_cache_hits')
+                        finished(file_path, self._write_txt(file_path, output_dir, cached))
+                        logging.info(f"  ✓ {file_path.name}: נמצא ב-cache OCR")
+                        continue
+                    metrics.current().increment('ocr_cache_misses')
+                    
+                    if file_path.suffix.lower() == '.pdf':
+                        page_counts[file_path] = self._count_pages(file_path)
+                        checkpoints[file_path] = self._checkpoint_for(cache_keys[file_path], file_path, output_dir)
+                        page_texts[file_path] = checkpoints[file_path].load()
+                        if self.low_memory:
+                            page_texts[file_path] = dict.fromkeys(page_texts[file_path])
+                        if page_texts[file_path]:
+                            logging.info(f"  {file_path.name}: ממשיך מ-checkpoint "
+                                         f"({len(page_texts[file_path])}/{page_counts[file_path]} עמודים)")
+                        jobs = [
+                            (page_num, pool.submit(_ocr_pdf_page, str(file_path), page_num,
+                                                   self.languages, self.render_scale,
+                                                   self.text_layer_min_chars, self.max_page_pixels,
+                                                   self.low_memory, self.preprocess_dpi))
+                            for page_num in range(page_counts[file_path])
+                            if page_num not in page_texts[file_path]
+                        ]
+                    else:
+                        page_counts[file_path] = 1
+                        page_texts[file_path] = {}
+                        jobs = [(0, pool.submit(_ocr_image_file, str(file_path), self.languages,
+                                                self.preprocess_dpi))]
+                except Exception as e:
+                    logging.error(f"  ✗ {file_path.name}: שגיאה - {e}")
+                    failed_set.add(file_path)
+                    continue
+                
+                page_methods[file_path] = {'text_layer': 0, 'ocr': 0}
+                file_futures[file_path] = [future for _, future in jobs]
+                for page_num, future in jobs:
+                    futures[future] = (file_path, page_num)
+                
+                if not jobs:
+                    finished(file_path, self._write_pages(
+                        file_path, output_dir, self._collected_pages(page_texts.pop(file_path), checkpoints.get(file_path)),
+                        page_counts[file_path],
+                        cache_keys[file_path], checkpoints.get(file_path), page_methods[file_path]
+                    ))
+            
+            for future in as_completed(futures):
+                file_path, page_num = futures[future]
+                if file_path in failed_set:
+                    continue
+                
+                try:
+                    text, method, timings = future.result()
+                    page_methods[file_path][method] += 1
+                    if timings:
+                        _record_page_timings(timings)
+                    if file_path in checkpoints:
+                        checkpoints[file_path].append(page_num, text)
+                    page_texts[file_path][page_num] = None if self.low_memory and file_path in checkpoints else text
+                except Exception as e:
+                    logging.error(f"  ✗ {file_path.name} עמוד {page_num + 1}: {e}")
+                    failed_set.add(file_path)
+                    for other in file_futures[file_path]:
+                        other.cancel()
+                    continue
+                
+                if len(page_texts[file_path]) == page_counts[file_path]:
+                    try:
+                        finished(file_path, self._write_pages(
+                            file_path, output_dir,
+                            self._collected_pages(page_texts.pop(file_path), checkpoints.get(file_path)),
+                            page_counts[file_path],
+                            cache_keys[file_path], checkpoints.get(file_path), page_methods[file_path]
+                        ))
+                        metrics.current().record_item('ocr', file_path.name, time.perf_counter() - started[file_path])
+                    except Exception as e:
+                        logging.error(f"  ✗ {file_path.name}: שגיאה בשמירה - {e}")
+                        failed_set.add(file_path)
+        
+        # שמירה על סדר הקבצים המקורי
+        successful = [results[f] for f in files if f in results]
+        failed = [f for f in files if f in failed_set]
+        return successful, failed
+    
+    def _collected_pages(self, pages: Dict[int, str], checkpoint: _PageCheckpoint = None) -> Dict[int, str]:
+        """במצב low_memory הטקסטים נשמרו רק ב-checkpoint - קוראים אותם מהדיסק רק בסוף הקובץ"""
+        if self.low_memory and checkpoint is not None:
+            return checkpoint.load()
+        return pages
+    
+    def _count_pages(self, pdf_path: Path) -> int:
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(str(pdf_path))
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+    
+    def _write_pages(self, file_path: Path, output_dir: Path, pages: Dict[int, str], page_count: int,
+                     cache_key: str, checkpoint: _PageCheckpoint = None,
+                     page_methods: Dict[str, int] = None) -> Path:
+        """מרכיב את העמודים לפי הסדר, שומר ב-cache וכותב קובץ txt"""
+        text = "\n\n".join(pages[page_num] for page_num in range(page_count))
+        
+        self._cache_for(output_dir).put(cache_key, text)
+        txt_path = self._write_txt(file_path, output_dir, text)
+        
+        if checkpoint:
+            checkpoint.remove()
+        
+        if page_methods:
+            metrics.current().increment('ocr_pages_text_layer', page_methods['text_layer'])
+            metrics.current().increment('ocr_pages_tesseract', page_methods['ocr'])
+        
+        logging.info(f"  ✓ {file_path.name}: נשמר ב: {txt_path.name} ({page_count} עמודים)")
+        if page_methods and file_path.suffix.lower() == '.pdf':
+            logging.info(f"    {page_methods['text_layer']} עמודים משכבת טקסט, {page_methods['ocr']} ב-OCR")
+        return txt_path
+    
+    def _write_txt(self, file_path: Path, output_dir: Path, text: str) -> Path:
+        txt_path = self._txt_path(file_path, output_dir)
+        with open(txt_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return txt_path
+    
+    def _assign_txt_names(self, files: List[Path]):
+        """
+        שם קובץ הפלט הוא <stem>.txt, אלא אם כמה קבצים חולקים אותו stem
+        (למשל a.pdf ו-a.png) - אז <name>.txt כדי שלא ידרסו זה את זה
+        """
+        stems: Dict[str, int] = {}
+        for file_path in files:
+            stems[file_path.stem] = stems.get(file_path.stem, 0) + 1
+        
+        self._txt_names = {
+            file_path: f"{file_path.name}.txt" if stems[file_path.stem] > 1 else f"{file_path.stem}.txt"
+            for file_path in files
+        }
+    
+    def _txt_path(self, file_path: Path, output_dir: Path) -> Path:
+        return output_dir / self._txt_names.get(file_path, f"{file_path.stem}.txt")
+    
+    def _cache_for(self, output_dir: Path) -> OCRCache:
+        """ה-cache המשותף מ-cache_dir, או cache מקומי ליד קבצי הפלט"""
+        cache_dir = Path(self.cache_dir) if self.cache_dir else output_dir / ".ocr_cache"
+        if self._cache is None or self._cache.cache_dir != cache_dir:
+            self._cache = OCRCache(cache_dir, self._ocr_settings())
+        return self._cache
+    
+    def _ocr_settings(self) -> dict:
+        """כל מה שמשפיע על הטקסט שיוצא - חלק ממפתח ה-cache"""
+        try:
+            tesseract_version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            tesseract_version = "unknown"
+        
+        settings = {
+            'languages': self.languages,
+            'render_scale': self.render_scale,
+            'text_layer_min_chars': self.text_layer_min_chars,
+            'tesseract_version': tesseract_version,
+        }
+        if self.low_memory:
+            # רינדור אחר יכול לתת טקסט אחר; בלי low_memory המפתח נשאר כמו קודם
+            settings['low_memory'] = {'grayscale': True, 'max_page_pixels': self.max_page_pixels}
+        if self.preprocess_dpi:
+            settings['preprocess_dpi'] = self.preprocess_dpi
+        return settings
+    
+    def _checkpoint_for(self, cache_key: str, file_path: Path, output_dir: Path) -> _PageCheckpoint:
+        return _PageCheckpoint(output_dir / ".checkpoints" / f"{cache_key}.jsonl", file_path)
+    
     def _collect_files(self, input_dir: Path) -> List[Path]:
         """אוסף קבצים מהתיקייה"""
         files = []
         for ext in ['.pdf', '.jpg', '.jpeg', '.png']:
             files.extend(list(input_dir.glob(f"*{ext}")))
             files.extend(list(input_dir.glob(f"*{ext.upper()}")))
-        return files
+        # ב-Windows glob לא רגיש לאותיות, כך ש-*.pdf ו-*.PDF מחזירים את אותם קבצים
+        return list(dict.fromkeys(files))
     
-    def _process_single_file(self, file_path: Path, output_dir: Path) -> Path:
-        """מעבד קובץ בודד"""
+    def _process_single_file(self, file_path: Path, output_dir: Path, original_path: Path = None) -> Path:
+        """
+        מעבד קובץ בודד.
+        original_path - הקובץ המקורי כשמעבדים העתק זמני (לשם קובץ הפלט)
+        """
         try:
-            txt_path = output_dir / f"{file_path.stem}.txt"
+            cache = self._cache_for(output_dir)
+            cache_key = cache.key_for(file_path)
+            source = original_path or file_path
             
-            if txt_path.exists():
-                logging.info(f"    כבר קיים, מדלג\n")
+            cached = cache.get(cache_key)
+            if cached is not None:
+                metrics.current().increment('ocr_cache_hits')
+                txt_path = self._write_txt(source, output_dir, cached)
+                logging.info(f"    נמצא ב-cache OCR: {txt_path.name}\n")
                 return txt_path
+            metrics.current().increment('ocr_cache_misses')
             
+            checkpoint = None
             if file_path.suffix.lower() == '.pdf':
-                text = self._process_pdf(file_path)
+                checkpoint = self._checkpoint_for(cache_key, file_path, output_dir)
+                text = self._process_pdf(file_path, checkpoint)
             else:
                 text = self._process_image(file_path)
             
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write(text)
+            cache.put(cache_key, text)
+            txt_path = self._write_txt(source, output_dir, text)
+            
+            if checkpoint:
+                checkpoint.remove()
             
             logging.info(f"  ✓ נשמר ב: {txt_path.name}\n")
             return txt_path
@@ -128,16 +567,10 @@ class OCRProcessor:
             logging.info(f"   מעתיק זמנית ל: {temp_name}")
             shutil.copy2(pdf_path, temp_path)
             
-            result = self._process_single_file(temp_path, output_dir)
+            result = self._process_single_file(temp_path, output_dir, original_path=pdf_path)
             
             temp_path.unlink()
             
-            if result:
-                correct_name = output_dir / f"{pdf_path.stem}.txt"
-                if result != correct_name:
-                    result.rename(correct_name)
-                    return correct_name
-            
             return result
             
         except Exception as e:
@@ -146,22 +579,120 @@ class OCRProcessor:
                 temp_path.unlink()
             return None
     
-    def _process_pdf(self, pdf_path: Path) -> str:
-        """מעבד קובץ PDF"""
-        pdf = pdfium.PdfDocument(str(pdf_path))
-        all_text = []
-        
-        for page_num in range(len(pdf)):
-            page = pdf[page_num]
-            pil_image = page.render(scale=2).to_pil()
-            text = pytesseract.image_to_string(pil_image, lang=self.languages)
-            all_text.append(text)
+    def _process_pdf(self, pdf_path: Path, checkpoint: _PageCheckpoint = None) -> str:
+        """
+        מעבד קובץ PDF בצינור: thread אחד מרנדר עמודים לתור חסום
+        ובמקביל tesseract מזהה את העמודים שכבר רונדרו.
+        עמודים עם שכבת טקסט שמישה נלקחים ישירות בלי רינדור ובלי OCR.
+        כל עמוד שהסתיים נכתב ל-checkpoint, וריצה חוזרת ממשיכה מהעמוד האחרון.
+        """
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(str(pdf_path))
+        try:
+            with _PDFIUM_LOCK:
+                page_count = len(pdf)
+            all_text = checkpoint.load() if checkpoint else {}
+            if all_text:
+                logging.info(f"    ממשיך מ-checkpoint: {len(all_text)}/{page_count} עמודים כבר הושלמו")
+            
+            pending = [page_num for page_num in range(page_count) if page_num not in all_text]
+            pages_queue = queue.Queue(maxsize=self.pipeline_depth)
+            stop = threading.Event()
+            renderer = threading.Thread(
+                target=self._render_pages,
+                args=(pdf, pending, pages_queue, stop),
+                daemon=True
+            )
+            renderer.start()
+            
+            page_methods = {'text_layer': 0, 'ocr': 0}
+            try:
+                while True:
+                    item = pages_queue.get()
+                    if item is None:
+                        break
+                    
+                    page_num, kind, payload = item
+                    if kind == 'error':
+                        raise payload
+                    
+                    if kind == 'text_layer':
+                        text = payload
+                    else:
+                        try:
+                            text, timings = _recognize(payload, self.languages, self.preprocess_dpi)
+                        finally:
+                            payload.close()
+                        _record_page_timings(timings)
+                    page_methods[kind] += 1
+                    if checkpoint:
+                        checkpoint.append(page_num, text)
+                    all_text[page_num] = None if self.low_memory and checkpoint else text
+            finally:
+                stop.set()
+                renderer.join()
+                # עמודים שרונדרו ולא נקראו מהתור (שגיאה באמצע)
+                while not pages_queue.empty():
+                    item = pages_queue.get_nowait()
+                    if item is not None and item[1] == 'ocr':
+                        item[2].close()
+        finally:
+            with _PDFIUM_LOCK:
+                pdf.close()
         
-        return "\n\n".join(all_text)
+        logging.info(f"    {page_methods['text_layer']} עמודים משכבת טקסט, {page_methods['ocr']} ב-OCR")
+        metrics.current().increment('ocr_pages_text_layer', page_methods['text_layer'])
+        metrics.current().increment('ocr_pages_tesseract', page_methods['ocr'])
+        all_text = self._collected_pages(all_text, checkpoint)
+        return "\n\n".join(all_text[page_num] for page_num in range(page_count))
+    
+    def _render_pages(self, pdf, page_nums: List[int], pages_queue: queue.Queue, stop: threading.Event):
+        """
+        שלב הרינדור בצינור - מסתיים תמיד ב-None כסימן סוף.
+        pdfium אינו thread-safe: כל הקריאות אליו (כולל סגירת ה-bitmap) נשארות ב-thread הזה,
+        ולתור נכנס עותק PIL שאינו תלוי בזיכרון של pdfium.
+        """
+        try:
+            for page_num in page_nums:
+                if stop.is_set():
+                    return
+                with _PDFIUM_LOCK:
+                    page = pdf[page_num]
+                    try:
+                        text = _text_layer(page, self.text_layer_min_chars)
+                        if text is not None:
+                            item = (page_num, 'text_layer', text)
+                        else:
+                            rendered = _render_page(page, self.render_scale, self.max_page_pixels,
+                                                    self.low_memory)
+                            try:
+                                item = (page_num, 'ocr', rendered[0].copy())
+                            finally:
+                                _close_rendered(rendered)
+                    finally:
+                        page.close()
+                if not self._put_until_stopped(pages_queue, item, stop) and item[1] == 'ocr':
+                    item[2].close()
+        except Exception as e:
+            self._put_until_stopped(pages_queue, (None, 'error', e), stop)
+        finally:
+            self._put_until_stopped(pages_queue, None, stop)
+    
+    def _put_until_stopped(self, pages_queue: queue.Queue, item, stop: threading.Event):
+        """put שלא נתקע אם הצרכן הפסיק לקרוא (שגיאה ב-OCR)"""
+        while not stop.is_set():
+            try:
+                pages_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
     
     def _process_image(self, image_path: Path) -> str:
         """מעבד קובץ תמונה"""
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image, lang=self.languages)
+        with Image.open(image_path) as image:
+            text, timings = _recognize(image, self.languages, self.preprocess_dpi)
+        _record_page_timings(timings)
+        metrics.current().increment('ocr_pages_tesseract')
         return text
 
@@ -3,10 +3,15 @@
 # openai_client.py - Wrapper ל-OpenAI
 # ============================================================================
 
+from email.utils import parsedate_to_datetime
 import logging
+import random
 import time
 import json
-from openai import OpenAI
+
+import metrics
+from rate_limiter import RateLimitScheduler, estimate_tokens, get_shared_scheduler
+from response_cache import ResponseCache
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s"
@@ -14,20 +19,52 @@ logging.basicConfig(
 class OpenAIClient:
     """Wrapper לקריאות OpenAI עם retry"""
     
-    def __init__(self, api_key: str, model: str = "gpt-4o"):
-        self.client = OpenAI(api_key=api_key)
+    # הערכת אורך התשובה לצורך שריון טוקנים מראש (מתוקן לפי usage אחרי הקריאה)
+    COMPLETION_TOKEN_ESTIMATE = 1000
+    RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+    
+    def __init__(self, api_key: str, model: str = "gpt-4o", cache: ResponseCache = None,
+                 scheduler: RateLimitScheduler = None, max_retries: int = 5, base_url: str = None):
+        # ה-SDK נטען רק כשנוצר client (הייבוא שלו לוקח כשנייה ומאט את פתיחת הממשק)
+        from openai import OpenAI
+        
+        # ה-SDK לא מנסה שוב בעצמו - ה-retry וה-backoff מנוהלים כאן מול ה-scheduler
+        # base_url - לשרת תואם OpenAI (למשל שרת הדמה של ה-benchmark)
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
         self.model = model
+        # cache אופציונלי - תשובות לאותו prompt בדיוק לא נשלחות שוב
+        self.cache = cache
+        self.scheduler = scheduler or get_shared_scheduler()
+        self.max_retries = max_retries
         logging.info(f"OpenAI client initialized with {model}")
     
     def call(self, prompt: str, system_prompt: str = None, 
         response_format: dict = None, temperature: float = 0) -> str:
-        """קריאה ל-OpenAI עם retry"""
+        """קריאה ל-OpenAI דרך התור המשותף, עם retry רק לשגיאות זמניות"""
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
         
-        for attempt in range(3):
+        cache_key = None
+        if self.cache:
+            cache_key = ResponseCache.make_key(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                response_format=response_format
+            )
+            cached = self.cache.get(cache_key)
+            # JSON פגום שנשמר בריצה קודמת לא מוחזר שוב - אחרת כל ניסיון חוזר מקבל את אותה תשובה
+            if cached is not None and self._cacheable(cached, response_format):
+                metrics.current().increment('llm_cache_hits')
+                return cached
+            metrics.current().increment('llm_cache_misses')
+        
+        estimated = sum(estimate_tokens(m["content"]) for m in messages) + self.COMPLETION_TOKEN_ESTIMATE
+        
+        for attempt in range(self.max_retries + 1):
+            self.scheduler.acquire(estimated)
             try:
                 params = {
                     "model": self.model,
@@ -38,14 +75,77 @@ class OpenAIClient:
                 if response_format:
                     params["response_format"] = response_format
                 
+                started = time.perf_counter()
                 response = self.client.chat.completions.create(**params)
-                return response.choices[0].message.content.strip()
+                metrics.current().observe('openai_call_seconds', time.perf_counter() - started)
+                if getattr(response, 'usage', None):
+                    self.scheduler.record_usage(estimated, response.usage.total_tokens)
+                    metrics.current().record_tokens(
+                        self.model, response.usage.prompt_tokens, response.usage.completion_tokens
+                    )
+                content = response.choices[0].message.content.strip()
+                
+                if cache_key and self._cacheable(content, response_format):
+                    self.cache.put(cache_key, content)
+                return content
                 
             except Exception as e:
-                logging.warning(f"נסיון {attempt + 1} נכשל: {e}")
-                if attempt < 2:
-                    time.sleep(1 + attempt)
-                else:
+                import openai
+                if not self._is_retryable(e) or attempt == self.max_retries:
+                    logging.warning(f"נסיון {attempt + 1} נכשל: {e}")
                     raise
+                
+                retry_after = self._retry_after(e)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                metrics.current().increment('openai_retries')
+                if isinstance(e, openai.RateLimitError):
+                    metrics.current().increment('openai_rate_limited')
+                    # 429 - כל הקריאות בתהליך ממתינות, לא רק זו
+                    self.scheduler.pause(delay)
+                
+                logging.warning(f"נסיון {attempt + 1} נכשל: {e} - ממתין {delay:.1f} שניות")
+                time.sleep(delay)
+    
+    @staticmethod
+    def _cacheable(content: str, response_format: dict) -> bool:
+        """כשמבקשים json_object נשמרות רק תשובות שעוברות json.loads"""
+        if not response_format or response_format.get('type') != 'json_object':
+            return True
+        try:
+            json.loads(content)
+            return True
+        except json.JSONDecodeError:
+            return False
+    
+    def _is_retryable(self, error: Exception) -> bool:
+        import openai
+        if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in self.RETRYABLE_STATUS
+        return False
+    
+    def _retry_after(self, error: Exception) -> float:
+        """קורא Retry-After / retry-after-ms מהתשובה (שניות או תאריך HTTP)"""
+        response = getattr(error, 'response', None)
+        if response is None:
+            return None
         
-        return ""
+        headers = response.headers
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            value = headers.get('retry-after')
+            if not value:
+                return None
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    
+    def _backoff(self, attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+        """exponential backoff עם jitter, כדי שקריאות מקבילות לא ינסו שוב באותו רגע"""
+        delay = min(cap, base * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
@@ -0,0 +1,417 @@
+# ============================================================================
+# pipeline.py - תהליך העיבוד המלא למטופל אחד (משותף ל-UI ולהרצת batch)
+# ============================================================================
+
+from datetime import datetime
+import json
+import logging
+from pathlib import Path
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, List, Tuple
+
+from config import Config
+import metrics
+from regulation_index import RegulationIndex
+from response_cache import ResponseCache
+
+# המודולים של השלבים מייבאים את openai, faiss, torch ו-tesseract - נטענים רק כשצריך אותם,
+# כדי שהממשק ייפתח מיד
+if TYPE_CHECKING:
+    from ocr_processor import OCRProcessor
+    from openai_client import OpenAIClient
+    from rag_system import RAGSystem
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+
+def create_ai_client() -> "OpenAIClient":
+    """יוצר client ל-OpenAI (עם cache תשובות אם הופעל בהגדרות)"""
+    from openai_client import OpenAIClient
+    from rate_limiter import get_shared_scheduler
+    
+    cache = None
+    if Config.LLM_CACHE_ENABLED:
+        cache = ResponseCache(
+            Config.LLM_CACHE_PATH,
+            max_bytes=Config.LLM_CACHE_MAX_MB * 1024 * 1024,
+            ttl_seconds=Config.LLM_CACHE_TTL_HOURS * 3600
+        )
+    return OpenAIClient(
+        api_key=Config.OPENAI_API_KEY,
+        model=Config.GPT_MODEL,
+        cache=cache,
+        scheduler=get_shared_scheduler(Config.OPENAI_RPM, Config.OPENAI_TPM),
+        max_retries=Config.MAX_RETRIES
+    )
+
+
+def load_rag(rag_file: Path = None, cache_dir: Path = None) -> "RAGSystem":
+    """טוען RAG (מה-cache אם rag.json והמודל לא השתנו). ברירת המחדל לקובץ ול-cache מההגדרות"""
+    from rag_system import RAGSystem
+    return RAGSystem.from_rag_file(
+        rag_file or Config.RAG_FILE,
+        model_path=Config.EMBEDDING_MODEL,
+        cache_dir=cache_dir or Config.RAG_CACHE_DIR,
+        normalize_embeddings=Config.RAG_NORMALIZE_EMBEDDINGS,
+        hybrid=Config.RAG_HYBRID,
+        rrf_k=Config.RAG_RRF_K,
+        index_type=Config.RAG_INDEX_TYPE,
+        index_params=Config.RAG_INDEX_PARAMS,
+        clause_chunks=Config.RAG_CLAUSE_CHUNKS
+    )
+
+
+def load_regulations() -> RegulationIndex:
+    """אינדקס התקנות לבדיקת הסעיף והאחוז בדירוג (None אם הבדיקה כובתה בהגדרות)"""
+    if not Config.GRADING_VALIDATE:
+        return None
+    return RegulationIndex.from_rag_file(Config.RAG_FILE)
+
+
+def create_grading_memo() -> ResponseCache:
+    """memo של דירוג האיברים (None אם כובה בהגדרות)"""
+    if not Config.GRADING_MEMO_ENABLED:
+        return None
+    return ResponseCache(Config.GRADING_MEMO_PATH, max_bytes=Config.LLM_CACHE_MAX_MB * 1024 * 1024)
+
+
+def create_ocr_processor(workers: int = None) -> "OCRProcessor":
+    from ocr_processor import OCRProcessor
+    return OCRProcessor(
+        tesseract_path=Config.TESSERACT_PATH,
+        languages=Config.OCR_LANGUAGES,
+        workers=workers or Config.OCR_WORKERS,
+        render_scale=Config.OCR_RENDER_SCALE,
+        pipeline_depth=Config.OCR_PIPELINE_DEPTH,
+        cache_dir=Config.OCR_CACHE_DIR,
+        use_text_layer=Config.PDF_USE_TEXT_LAYER,
+        text_layer_min_chars=Config.PDF_TEXT_LAYER_MIN_CHARS,
+        low_memory=Config.OCR_LOW_MEMORY,
+        max_page_pixels=Config.OCR_MAX_PAGE_PIXELS,
+        preprocess=Config.OCR_PREPROCESS,
+        preprocess_dpi=Config.OCR_PREPROCESS_TARGET_DPI
+    )
+
+
+def _log_to_logging(message: str, tag: str = ""):
+    if tag == "error":
+        logging.error(message)
+    elif tag == "warning":
+        logging.warning(message)
+    else:
+        logging.info(message)
+
+
+class PatientPipeline:
+    """
+    OCR -> חילוץ -> RAG -> ניתוח לתיקיית מטופל אחת.
+    ai_client ו-rag נטענים פעם אחת ומשותפים בין מטופלים; אם לא הועברו נטענים בפעם הראשונה שצריך אותם.
+    log(message, tag) - לאן לכתוב הודעות התקדמות (יומן ה-UI או logging).
+    confirm(title, question) - מה לעשות כשיש תוצרים מריצה קודמת; None = להשתמש בהם בלי לשאול.
+    incremental - בחילוץ, קבצים שלא השתנו נטענים מה-manifest של הריצה הקודמת.
+    refresh_grading - לדרג מחדש את כל האיברים גם אם יש להם תוצאה ב-memo.
+    streaming - כל מסמך נשלח לחילוץ מיד כשה-OCR שלו מסתיים (תור חסום), ו-RAG נטען במקביל.
+    """
+
+    def __init__(self, ai_client: "OpenAIClient" = None, rag: "RAGSystem" = None,
+                 log: Callable[[str, str], None] = None, confirm: Callable[[str, str], bool] = None,
+                 ocr_workers: int = None, incremental: bool = True,
+                 grading_memo: ResponseCache = None, refresh_grading: bool = False,
+                 regulations: RegulationIndex = None, streaming: bool = False):
+        self.ai_client = ai_client
+        self.rag = rag
+        self.log = log or _log_to_logging
+        self.confirm = confirm
+        self.ocr_workers = ocr_workers
+        self.incremental = incremental
+        self.grading_memo = grading_memo
+        self.refresh_grading = refresh_grading
+        self.regulations = regulations
+        self.streaming = streaming
+        # נעילה נפרדת לכל משאב: חילוץ לא מחכה ל-RAG שעוד נטען ברקע
+        self._client_lock = threading.Lock()
+        self._rag_lock = threading.Lock()
+        self._memo_lock = threading.Lock()
+        self._regulations_lock = threading.Lock()
+
+    def get_ai_client(self) -> "OpenAIClient":
+        with self._client_lock:
+            if self.ai_client is None:
+                self.ai_client = create_ai_client()
+            return self.ai_client
+
+    def get_rag(self) -> "RAGSystem":
+        with self._rag_lock:
+            if self.rag is None:
+                with metrics.current().stage('rag_load'):
+                    self.rag = load_rag()
+                self.log(f"✓ RAG נטען: {len(self.rag.texts)} רשומות", "success")
+            return self.rag
+
+    def get_grading_memo(self) -> ResponseCache:
+        with self._memo_lock:
+            if self.grading_memo is None:
+                self.grading_memo = create_grading_memo()
+            return self.grading_memo
+
+    def get_regulations(self) -> RegulationIndex:
+        with self._regulations_lock:
+            if self.regulations is None:
+                self.regulations = load_regulations()
+            return self.regulations
+
+    def prewarm(self) -> float:
+        """
+        טוען מראש את RAG, מודל ה-embedding וה-client (לקריאה מ-thread ברקע כשהממשק נפתח).
+        run() שמתחיל באמצע ממתין לטעינה הזו במקום לטעון שוב.
+
+        Returns:
+            שניות עד שהכל מוכן
+        """
+        started = time.perf_counter()
+        self.get_rag().warm_up()
+        self.get_ai_client()
+        return time.perf_counter() - started
+
+    def _should_reuse(self, title: str, question: str) -> bool:
+        return self.confirm is None or self.confirm(title, question)
+
+    def run(self, input_dir: Path, output_dir: Path, ocr_dir: Path = None) -> dict:
+        """
+        מריץ את כל התהליך ושומר את התוצרים ב-output_dir:
+        extracted_json/, final_disability_assessment.json, disability_report.txt
+
+        Returns:
+            תוצאות הניתוח
+        """
+        input_dir = Path(input_dir)
+        output_dir = Path(output_dir)
+        ocr_dir = Path(ocr_dir) if ocr_dir else input_dir / "ocr_txt"
+        output_dir.mkdir(parents=True, exist_ok=True)
+        ocr_dir.parent.mkdir(parents=True, exist_ok=True)
+
+        run_metrics = metrics.current()
+        json_dir = output_dir / "extracted_json"
+        consolidated_file = json_dir / "all_medical_data_consolidated.json"
+
+        medical_data = None
+
+        if consolidated_file.exists():
+            self.log(f"נמצא קובץ נתונים מאוחד: {consolidated_file.name}", "info")
+            if self._should_reuse(
+                "נתונים קיימים",
+                "נמצא קובץ אבחנות רפואיות מוכן.\nהאם להשתמש בו ולדלג לניתוח אחוזי הנכות?"
+            ):
+                with open(consolidated_file, 'r', encoding='utf-8') as f:
+                    medical_data = json.load(f)
+                self.log("✓ טוען נתונים מקובץ קיים", "success")
+
+        if medical_data is None:
+            needs_ocr = True
+            existing_txt = list(ocr_dir.glob("*.txt")) if ocr_dir.exists() else []
+            if existing_txt:
+                self.log(f"נמצאו {len(existing_txt)} קבצי טקסט קיימים", "info")
+                needs_ocr = not self._should_reuse(
+                    "קבצי טקסט קיימים",
+                    "נמצאו קבצי טקסט מעיבוד קודם.\nלהשתמש בהם במקום להריץ OCR מחדש?"
+                )
+            else:
+                self.log("שלב 1/4: מבצע OCR על המסמכים...", "info")
+
+            from medical_extractor import MedicalJSONExtractor
+            extractor = MedicalJSONExtractor(
+                self.get_ai_client(),
+                max_workers=Config.EXTRACTION_CONCURRENCY,
+                chunk_size=Config.MAX_CHUNK_SIZE
+            )
+            json_dir.mkdir(exist_ok=True)
+
+            if needs_ocr and self.streaming:
+                self.log("שלב 2/4: חילוץ מידע רפואי באמצעות AI - כל מסמך מיד כשה-OCR שלו מסתיים...", "info")
+                medical_data = self._run_streaming(input_dir, ocr_dir, json_dir, extractor)
+            else:
+                txt_files = self.run_ocr(input_dir, ocr_dir)[0] if needs_ocr else existing_txt
+                if not txt_files:
+                    raise Exception("לא נמצאו קבצי טקסט לעיבוד")
+
+                # חילוץ JSON
+                self.log("שלב 2/4: חילוץ מידע רפואי באמצעות AI...", "info")
+                with run_metrics.stage('extraction'):
+                    medical_data = extractor.extract_from_directory(ocr_dir, json_dir, incremental=self.incremental)
+            self.log("✓ חילוץ מידע הושלם", "success")
+
+        if not medical_data or not medical_data.get('diagnoses_by_body_part'):
+            raise Exception("לא נמצאו אבחנות רפואיות בנתונים")
+
+        self.log("שלב 3/4: טעינת בסיס נתונים רפואי (RAG)...", "info")
+        rag = self.get_rag()
+
+        self.log("שלב 4/4: ניתוח והערכת אחוזי נכות...", "info")
+        from disability_analyzer import DisabilityAnalyzer
+        analyzer = DisabilityAnalyzer(
+            self.get_ai_client(),
+            rag,
+            max_workers=Config.ANALYSIS_CONCURRENCY,
+            organ_timeout=Config.ORGAN_TIMEOUT_SEC,
+            rag_k=Config.DEFAULT_TOP_K,
+            context_token_budget=Config.RAG_CONTEXT_TOKEN_BUDGET,
+            max_distance=Config.RAG_CONTEXT_MAX_DISTANCE,
+            memo=self.get_grading_memo(),
+            refresh_memo=self.refresh_grading,
+            regulations=self.get_regulations(),
+            max_reasks=Config.GRADING_MAX_REASKS
+        )
+        with run_metrics.stage('analysis'):
+            results = analyzer.analyze_patient_data(medical_data)
+        self.log("✓ חישוב אחוזי נכות הושלם", "success")
+
+        results_file = output_dir / "final_disability_assessment.json"
+        with open(results_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+        report_file = output_dir / "disability_report.txt"
+        with open(report_file, 'w', encoding='utf-8') as f:
+            f.write(generate_report(results))
+
+        self.log(f"תוצאות נשמרו ב: {results_file}", "info")
+        self.log(f"דוח נשמר ב: {report_file}", "info")
+        return results
+
+    def _run_streaming(self, input_dir: Path, ocr_dir: Path, json_dir: Path, extractor) -> dict:
+        """
+        OCR וחילוץ במקביל: ה-OCR רץ ב-thread משלו ומכניס כל TXT לתור חסום
+        (Config.STREAM_QUEUE_SIZE), והחילוץ שולף ממנו ושולח ל-GPT מיד. RAG נטען ברקע בינתיים.
+        """
+        threading.Thread(target=metrics.propagate(self._load_rag_in_background), daemon=True).start()
+
+        txt_queue: "queue.Queue[Path]" = queue.Queue(maxsize=Config.STREAM_QUEUE_SIZE)
+        ocr_outcome = {}
+
+        def produce():
+            try:
+                ocr_outcome['files'] = self.run_ocr(input_dir, ocr_dir, on_file_done=txt_queue.put)
+            except Exception as e:
+                ocr_outcome['error'] = e
+            finally:
+                txt_queue.put(None)
+
+        producer = threading.Thread(target=metrics.propagate(produce), daemon=True)
+        producer.start()
+        try:
+            with metrics.current().stage('extraction'):
+                medical_data = extractor.extract_stream(txt_queue, ocr_dir, json_dir, incremental=self.incremental)
+        except Exception:
+            # ממשיכים לרוקן את התור, כדי שה-OCR לא ייתקע על תור מלא שאף אחד לא קורא ממנו
+            while producer.is_alive() or not txt_queue.empty():
+                try:
+                    txt_queue.get(timeout=0.5)
+                except queue.Empty:
+                    pass
+            raise
+        producer.join()
+
+        if 'error' in ocr_outcome:
+            raise ocr_outcome['error']
+        if not medical_data:
+            raise Exception("לא נמצאו קבצי טקסט לעיבוד")
+        return medical_data
+
+    def _load_rag_in_background(self):
+        try:
+            self.get_rag()
+        except Exception as e:
+            # שלב ה-RAG ינסה לטעון שוב ויציג את השגיאה במקומה
+            self.log(f"טעינת RAG ברקע נכשלה: {e}", "warning")
+
+    def run_ocr(self, input_dir: Path, ocr_dir: Path,
+                on_file_done: Callable[[Path], None] = None) -> Tuple[List[Path], List[Path]]:
+        """מריץ OCR (on_file_done - ראה OCRProcessor.process_directory)"""
+        ocr = create_ocr_processor(self.ocr_workers)
+        with metrics.current().stage('ocr'):
+            successful, failed = ocr.process_directory(input_dir, ocr_dir, on_file_done=on_file_done)
+
+        self.log(f"✓ OCR הושלם: {len(successful)} הצליחו, {len(failed)} נכשלו", "success")
+
+        if failed:
+            self.log("קבצים שנכשלו:", "warning")
+            for f in failed:
+                self.log(f"  • {f.name}", "warning")
+
+        return successful, failed
+
+    def write_metrics(self, run_metrics: metrics.MetricsRecorder, output_dir: Path, prometheus: bool = True):
+        """
+        שומר את מדדי הריצה ליד final_disability_assessment.json (ו-Prometheus אם הוגדר).
+        ב-batch מעבירים prometheus=False - את קובץ ה-Prometheus כותב ה-batch עם הסכום של כל המטופלים.
+        """
+        metrics_file = output_dir / "run_metrics.json"
+        snapshot = run_metrics.write_json(metrics_file)
+        if prometheus and Config.METRICS_PROMETHEUS_FILE:
+            run_metrics.write_prometheus(Config.METRICS_PROMETHEUS_FILE)
+
+        stages = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in snapshot['stages_sec'].items())
+        tokens = sum(u['prompt_tokens'] + u['completion_tokens'] for u in snapshot['tokens'].values())
+        self.log(f"⏱ זמנים: {stages}", "info")
+        self.log(f"טוקנים: {tokens}, עלות משוערת: ${snapshot['total_cost_usd']}", "info")
+        for name, rate in snapshot['derived'].items():
+            if name.endswith('_hit_rate'):
+                self.log(f"{name}: {rate:.0%}", "info")
+        self.log(f"מדדים נשמרו ב: {metrics_file.name}", "info")
+
+
+def generate_report(results: dict) -> str:
+    """יצירת דוח"""
+    report = f"""
+╔══════════════════════════════════════════════════════════════════╗
+║              דוח הערכת נכות - ביטוח לאומי                       ║
+╚══════════════════════════════════════════════════════════════════╝
+
+תאריך: {datetime.now().strftime('%d/%m/%Y %H:%M')}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+אחוזי נכות לפי איברים
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+"""
+    for item in results.get('breakdown', []):
+        report += f"🔹 {item['organ']}: {item['percent']}% (סעיף {item['section']})\n"
+        if item.get('validation_warning'):
+            report += f"   ⚠️ לא תואם לתקנות - לבדיקה ידנית: {item['validation_warning']}\n"
+
+    report += f"""
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+נכות מצטברת
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+סה"כ לפי נוסחת בלבנד: {results.get('total_disability', 0)}%
+
+הערות:
+1. זהו חישוב ראשוני - יש להתייעץ עם עו"ד מומחה
+2. נדרשת בדיקת חפיפות בין פגיעות
+3. החישוב דורש אישור רפואי מוסמך
+
+"""
+
+    missing_info_items = [
+        r for r in results.get('full_results', [])
+        if float(r.get('disability_percentage', 0)) == 0
+    ]
+
+    if missing_info_items:
+        report += """
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+⚠️  איברים הדורשים התייחסות רפואית נוספת (0%)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+"""
+        for item in missing_info_items:
+            report += f"🔸 {item['body_part']}\n"
+            reason = item.get('reasoning', 'נדרש תיעוד רפואי נוסף')
+            report += f"   הנחיה: {reason}\n\n"
+
+    return report
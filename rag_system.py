@@ -1,59 +1,412 @@
-
 # ============================================================================
 # rag_system.py - מערכת RAG (זהה)
 # ============================================================================
 
+import hashlib
+import json
 import logging
+import shutil
+import threading
+import time
+from pathlib import Path
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
 from typing import List, Tuple
+
+import metrics
+import vector_index
+from bm25_index import BM25Index, tokenize_hebrew
+from rate_limiter import estimate_tokens
+from section_chunker import chunk_sections, render_section
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 class RAGSystem:
-    """מערכת RAG עם FAISS"""
+    """מערכת RAG עם FAISS (ואופציונלית BM25 משולב)"""
+    
+    # כמה מועמדים כל אחד מהאינדקסים מחזיר לאיחוד, ביחס ל-k
+    HYBRID_CANDIDATE_FACTOR = 4
+    # בחיפוש על תתי-סעיפים: כמה תתי-סעיפים נשלפים לכל סעיף מבוקש, לפני הקיבוץ לפי סעיף אב
+    CLAUSE_CANDIDATE_FACTOR = 3
+    # סעיף שרוב הטוקנים שלו (החלק הזה) כבר מופיעים בסעיף שנבחר להקשר - כפול, ולא נכנס שוב
+    CONTEXT_OVERLAP_THRESHOLD = 0.8
+    CONTEXT_HEADER = "סעיפים רלוונטיים:\n\n"
     
-    def __init__(self, model_path: str):
-        logging.info(f"טוען מודל embedding: {model_path}")
-        self.model = SentenceTransformer(model_path)
+    def __init__(self, model_path: str, cache_dir: Path = None, normalize_embeddings: bool = False,
+                 hybrid: bool = False, rrf_k: int = 60, index_type: str = "flat_l2", index_params: dict = None,
+                 clause_chunks: bool = False):
+        self.model_path = model_path
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        # index_type - ראה vector_index.INDEX_TYPES; index_params - M/nlist/nprobe/m/nbits לפי הסוג
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        if vector_index.requires_normalized(index_type) and not normalize_embeddings:
+            logging.info(f"{index_type} דורש embeddings מנורמלים - מפעיל נרמול")
+            normalize_embeddings = True
+        self.normalize_embeddings = normalize_embeddings
+        # hybrid - איחוד דירוג FAISS ודירוג BM25 ב-Reciprocal Rank Fusion:
+        # מוצא התאמות מדויקות (מונחים לטיניים, מספרי סעיפים) שה-embedding מפספס
+        self.hybrid = hybrid
+        self.rrf_k = rrf_k
+        # clause_chunks - האינדקס בנוי מתתי-סעיפים (א/ב/ג, (1)/(2), I/II) והתוצאות מקובצות חזרה לסעיף,
+        # עם הכותרת ורק תתי-הסעיפים שנמצאו (ראה section_chunker)
+        self.clause_chunks = clause_chunks
+        self._model = None
+        # warm_up ברקע, run() ומטופלים מקבילים ב-batch ניגשים למודל יחד - רק אחד טוען אותו
+        self._model_lock = threading.Lock()
         self.texts: List[str] = []
         self.metadata: List[dict] = []
+        self.embeddings: np.ndarray = None
         self.index = None
+        self.bm25: BM25Index = None
+    
+    @property
+    def model(self) -> "SentenceTransformer":
+        """טעינת המודל רק כשצריך לקודד (בטעינה מה-cache אין צורך)"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    # sentence_transformers מייבא את torch - נטען רק כאן ולא בייבוא המודול
+                    from sentence_transformers import SentenceTransformer
+                    logging.info(f"טוען מודל embedding: {self.model_path}")
+                    self._model = SentenceTransformer(self.model_path)
+        return self._model
+    
+    def warm_up(self):
+        """טוען את המודל ומריץ קידוד ראשון מראש, כדי שהשאילתה הראשונה לא תשלם על האתחול"""
+        self.model.encode(["חימום"], normalize_embeddings=self.normalize_embeddings)
+    
+    @classmethod
+    def from_rag_file(cls, rag_file: Path, model_path: str, cache_dir: Path = None,
+                      normalize_embeddings: bool = False, hybrid: bool = False,
+                      rrf_k: int = 60, index_type: str = "flat_l2",
+                      index_params: dict = None, clause_chunks: bool = False) -> "RAGSystem":
+        """טוען rag.json ובונה אינדקס (או טוען אותו מה-cache)"""
+        raw = Path(rag_file).read_bytes()
+        rag_data = json.loads(raw.decode('utf-8'))
+        
+        texts = []
+        metadata = []
+        # לפיצול לתתי-סעיפים: כותרת + גוף לכל סעיף (רשומה בלי content נשארת טקסט אחד)
+        sections = []
+        
+        if isinstance(rag_data, dict):
+            for key, value in rag_data.items():
+                text = json.dumps(value, ensure_ascii=False) if isinstance(value, dict) else str(value)
+                texts.append(text)
+                metadata.append({'section_number': key, 'title': key})
+                body = value.get('content') if isinstance(value, dict) else str(value)
+                sections.append({'header': key, 'body': body if isinstance(body, str) else text})
+        
+        elif isinstance(rag_data, list):
+            for i, item in enumerate(rag_data):
+                if isinstance(item, dict):
+                    text = json.dumps(item, ensure_ascii=False)
+                    section_id = item.get('id') or item.get('section') or f"section_{i}"
+                    title = item.get('title') or section_id
+                    body = item.get('content')
+                    sections.append({'header': item.get('subject') or title,
+                                     'body': body if isinstance(body, str) else text})
+                else:
+                    text = str(item)
+                    section_id = f"section_{i}"
+                    title = section_id
+                    sections.append({'header': '', 'body': text})
+                
+                texts.append(text)
+                metadata.append({'section_number': section_id, 'title': title})
+        
+        if clause_chunks:
+            for section, meta in zip(sections, metadata):
+                section['metadata'] = meta
+            texts, metadata = chunk_sections(sections)
+            logging.info(f"{len(sections)} סעיפים פוצלו ל-{len(texts)} תתי-סעיפים")
+        
+        rag = cls(model_path, cache_dir=cache_dir, normalize_embeddings=normalize_embeddings,
+                  hybrid=hybrid, rrf_k=rrf_k, index_type=index_type, index_params=index_params,
+                  clause_chunks=clause_chunks)
+        rag.build_index(texts, metadata, source_hash=hashlib.sha256(raw).hexdigest())
+        return rag
     
-    def build_index(self, texts: List[str], metadata: List[dict] = None):
+    def build_index(self, texts: List[str], metadata: List[dict] = None, source_hash: str = None):
+        """
+        בונה אינדקס. אם הוגדר cache_dir ו-source_hash - טוען מהדיסק כשהמפתח תואם,
+        ואחרת מקודד מחדש ושומר.
+        """
         self.texts = texts
         self.metadata = metadata or [{'index': i} for i in range(len(texts))]
         
+        cache_key = self._cache_key(source_hash) if self.cache_dir and source_hash else None
+        if cache_key and self._load_cache(cache_key):
+            metrics.current().increment('rag_cache_hits')
+            self._build_lexical_index()
+            logging.info(f"✓ אינדקס FAISS ({self.index_type}) נטען מה-cache עם {self.index.ntotal} chunks\n")
+            return
+        
+        if cache_key:
+            metrics.current().increment('rag_cache_misses')
+        
         logging.info("יוצר embeddings...")
-        embeddings = self.model.encode(texts, show_progress_bar=True)
+        embeddings = self.model.encode(
+            texts,
+            show_progress_bar=True,
+            normalize_embeddings=self.normalize_embeddings
+        )
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        
+        self.index = vector_index.build_index(self.embeddings, self.index_type, self.index_params)
+        if self.index_type in vector_index.COMPRESSED_TYPES:
+            # הווקטורים שמורים דחוסים באינדקס - לא מחזיקים עותק מלא בזיכרון ובדיסק
+            self.embeddings = None
+        
+        if cache_key:
+            self._save_cache(cache_key)
         
-        dim = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(np.array(embeddings))
+        self._build_lexical_index()
+        logging.info(f"✓ אינדקס FAISS ({self.index_type}) נבנה עם {self.index.ntotal} chunks\n")
+    
+    def _build_lexical_index(self):
+        """BM25 נבנה מהטקסטים בכל טעינה - מהיר מספיק כדי שלא יצטרך cache"""
+        if self.hybrid:
+            self.bm25 = BM25Index().fit(self.texts)
+    
+    def _cache_key(self, source_hash: str) -> str:
+        """מפתח cache: תוכן rag.json + מודל ה-embedding + הגדרות הנרמול + סוג האינדקס"""
+        parts = {
+            'source_hash': source_hash,
+            'model': self.model_path,
+            'normalize_embeddings': self.normalize_embeddings,
+            'index_type': self.index_type,
+            'index_params': self.index_params,
+            'clause_chunks': self.clause_chunks,
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def _load_cache(self, cache_key: str) -> bool:
+        import faiss
+        entry_dir = self.cache_dir / cache_key[:16]
+        try:
+            with open(entry_dir / "meta.json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('cache_key') != cache_key:
+                return False
+            
+            with open(entry_dir / "texts.json", 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            embeddings_file = entry_dir / "embeddings.npy"
+            embeddings = np.load(embeddings_file) if embeddings_file.exists() else None
+            index = faiss.read_index(str(entry_dir / "index.faiss"))
+            vector_index.configure_search(index, self.index_params)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logging.warning(f"cache של RAG פגום, בונה מחדש: {e}")
+            return False
         
-        logging.info(f"✓ אינדקס FAISS נבנה עם {self.index.ntotal} chunks\n")
+        self.texts = stored['texts']
+        self.metadata = stored['metadata']
+        self.embeddings = embeddings
+        self.index = index
+        return True
+    
+    def _save_cache(self, cache_key: str):
+        """שמירה לתיקייה זמנית והחלפה, כדי שריצה שנקטעה לא תשאיר cache חלקי"""
+        import faiss
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            entry_dir = self.cache_dir / cache_key[:16]
+            tmp_dir = self.cache_dir / f".tmp_{cache_key[:16]}"
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir)
+            tmp_dir.mkdir()
+            
+            faiss.write_index(self.index, str(tmp_dir / "index.faiss"))
+            if self.embeddings is not None:
+                np.save(tmp_dir / "embeddings.npy", self.embeddings)
+            with open(tmp_dir / "texts.json", 'w', encoding='utf-8') as f:
+                json.dump({'texts': self.texts, 'metadata': self.metadata}, f, ensure_ascii=False)
+            with open(tmp_dir / "meta.json", 'w', encoding='utf-8') as f:
+                json.dump({'cache_key': cache_key, 'model': self.model_path,
+                           'normalize_embeddings': self.normalize_embeddings,
+                           'index_type': self.index_type}, f)
+            
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            tmp_dir.rename(entry_dir)
+            
+            # מחיקת רשומות ישנות (rag.json או מודל שהשתנו)
+            for other in self.cache_dir.iterdir():
+                if other != entry_dir and (other / "meta.json").exists():
+                    shutil.rmtree(other, ignore_errors=True)
+            
+            logging.info(f"cache של RAG נשמר ב: {entry_dir}")
+        except Exception as e:
+            logging.warning(f"שמירת cache של RAG נכשלה: {e}")
     
     def query(self, question: str, k: int = 7) -> List[Tuple[str, dict, float]]:
+        return self.query_many([question], k)[0]
+    
+    def query_many(self, questions: List[str], k: int = 7) -> List[List[Tuple[str, dict, float]]]:
+        """
+        כמה שאילתות יחד: קידוד אחד ב-batch וחיפוש FAISS אחד על מטריצת השאילתות.
+        מחזיר רשימת תוצאות לכל שאילתה, באותו סדר.
+        """
         if self.index is None:
             raise ValueError("Index not built")
+        if not questions:
+            return []
         
-        q_emb = self.model.encode([question])
-        distances, ids = self.index.search(np.array(q_emb), k)
+        started = time.perf_counter()
+        q_emb = np.asarray(
+            self.model.encode(list(questions), normalize_embeddings=self.normalize_embeddings), dtype=np.float32
+        )
+        
+        # limit - כמה chunks לשלוף; בתתי-סעיפים יותר, כי כמה מהם מתקבצים לאותו סעיף
+        limit = k * self.CLAUSE_CANDIDATE_FACTOR if self.clause_chunks else k
+        candidates = min(self.index.ntotal, limit)
+        if self.bm25 is not None:
+            candidates = min(self.index.ntotal, max(limit, limit * self.HYBRID_CANDIDATE_FACTOR))
+        distances, ids = self.index.search(q_emb, candidates)
+        
+        all_results = []
+        if vector_index.uses_inner_product(self.index_type):
+            # דמיון קוסינוס -> מרחק L2 בריבוע (על וקטורים מנורמלים), כדי שהמרחק יהיה אחיד בכל סוגי האינדקס
+            distances = 2 - 2 * distances
+        
+        for row, question in enumerate(questions):
+            dense = [(int(idx), float(dist)) for dist, idx in zip(distances[row], ids[row]) if idx >= 0]
+            if self.bm25 is not None:
+                results = self._fuse(question, q_emb[row], dense, limit)
+            else:
+                results = [(self.texts[idx], self.metadata[idx], dist) for idx, dist in dense[:limit]]
+            all_results.append(self._group_by_section(results, k) if self.clause_chunks else results)
+        
+        # זמן לשאילתה, כדי שיהיה בר השוואה לשאילתות בודדות
+        per_query = (time.perf_counter() - started) / len(questions)
+        for _ in questions:
+            metrics.current().observe('rag_query_seconds', per_query)
+        return all_results
+    
+    def _fuse(self, question: str, q_vec: np.ndarray, dense: List[Tuple[int, float]],
+              k: int) -> List[Tuple[str, dict, float]]:
+        """
+        Reciprocal Rank Fusion: ציון = סכום 1/(rrf_k + דירוג) על פני FAISS ו-BM25.
+        המרחק שמוחזר הוא תמיד מרחק ה-embedding, גם לסעיף שנמצא רק ב-BM25.
+        """
+        lexical = self.bm25.search(question, len(dense) or k)
+        
+        fused = {}
+        for rank, (idx, _) in enumerate(dense, 1):
+            fused[idx] = fused.get(idx, 0.0) + 1.0 / (self.rrf_k + rank)
+        for rank, (idx, _) in enumerate(lexical, 1):
+            fused[idx] = fused.get(idx, 0.0) + 1.0 / (self.rrf_k + rank)
+        
+        dense_dist = dict(dense)
+        top = sorted(fused, key=lambda idx: -fused[idx])[:k]
         
         results = []
-        for dist, idx in zip(distances[0], ids[0]):
-            results.append((self.texts[idx], self.metadata[idx], float(dist)))
+        for idx in top:
+            if idx in dense_dist:
+                dist = dense_dist[idx]
+            else:
+                metrics.current().increment('rag_lexical_only_hits')
+                dist = self._distance(idx, q_vec)
+            results.append((self.texts[idx], self.metadata[idx], dist))
+        return results
+    
+    @staticmethod
+    def _group_by_section(hits: List[Tuple[str, dict, float]], k: int) -> List[Tuple[str, dict, float]]:
+        """
+        מקבץ תתי-סעיפים לפי סעיף האב: k הסעיפים הראשונים לפי הדירוג של תת-הסעיף הטוב ביותר שלהם.
+        הטקסט - כותרת הסעיף ורק תתי-הסעיפים שנמצאו; המרחק - הקטן מבין תתי-הסעיפים.
+        """
+        groups = {}
+        for text, meta, dist in hits:
+            if meta['parent'] not in groups:
+                if len(groups) == k:
+                    continue
+                groups[meta['parent']] = []
+            groups[meta['parent']].append((meta, dist))
         
+        results = []
+        for clauses in groups.values():
+            metas = [meta for meta, _ in clauses]
+            section_meta = {key: value for key, value in metas[0].items()
+                            if key not in ('intro', 'clause', 'clause_order', 'path', 'body')}
+            section_meta['clauses'] = [meta['clause'] for meta in sorted(metas, key=lambda m: m['clause_order'])]
+            results.append((render_section(metas), section_meta, min(dist for _, dist in clauses)))
         return results
     
-    def query_as_context(self, question: str, k: int = 3) -> str:
-        results = self.query(question, k)
+    def _distance(self, idx: int, q_vec: np.ndarray) -> float:
+        """מרחק L2 בריבוע לסעיף מסוים (מהאינדקס עצמו כשה-embeddings לא נשמרו)"""
+        vector = self.embeddings[idx] if self.embeddings is not None else self.index.reconstruct(int(idx))
+        return float(np.sum((vector - q_vec) ** 2))
+    
+    def query_as_context(self, question: str, k: int = 3, token_budget: int = None,
+                         max_distance: float = None) -> str:
+        return self.select_context(self.query(question, k), token_budget, max_distance)[1]
+    
+    def query_as_context_many(self, questions: List[str], k: int = 3, token_budget: int = None,
+                              max_distance: float = None) -> List[str]:
+        return [self.select_context(results, token_budget, max_distance)[1]
+                for results in self.query_many(questions, k)]
+    
+    @classmethod
+    def select_context(cls, results: List[Tuple[str, dict, float]], token_budget: int = None,
+                       max_distance: float = None) -> Tuple[List[Tuple[str, dict, float]], str, int]:
+        """
+        בונה הקשר ל-prompt לפי סדר הדירוג, עם תקציב טוקנים:
+        - סעיף שהמרחק שלו מעל max_distance מדולג
+        - סעיף כפול או חופף לסעיף שכבר נבחר מדולג
+        - מפסיקים כשהסעיף הבא היה חורג מ-token_budget
+        הסעיף הראשון תמיד נכנס, כדי שלא יישלח prompt בלי אף סעיף.
+        
+        Returns:
+            (הסעיפים שנבחרו, טקסט ההקשר, הערכת מספר הטוקנים שלו)
+        """
+        run_metrics = metrics.current()
+        selected = []
+        selected_tokens = []
+        tokens = estimate_tokens(cls.CONTEXT_HEADER)
+        
+        for position, (text, meta, dist) in enumerate(results):
+            if selected and max_distance is not None and dist > max_distance:
+                run_metrics.increment('rag_context_dropped_distance')
+                continue
+            
+            words = set(tokenize_hebrew(text))
+            if any(cls._overlaps(words, other) for other in selected_tokens):
+                run_metrics.increment('rag_context_dropped_duplicate')
+                continue
+            
+            cost = estimate_tokens(cls._context_block(len(selected) + 1, text))
+            if selected and token_budget is not None and tokens + cost > token_budget:
+                run_metrics.increment('rag_context_dropped_budget', len(results) - position)
+                break
+            
+            selected.append((text, meta, dist))
+            selected_tokens.append(words)
+            tokens += cost
         
-        context = "סעיפים רלוונטיים:\n\n"
+        run_metrics.increment('rag_contexts')
+        run_metrics.increment('rag_context_tokens', tokens)
+        return selected, cls.format_context(selected), tokens
+    
+    @classmethod
+    def _overlaps(cls, words: set, other: set) -> bool:
+        """חפיפה = חלק הטוקנים של הסעיף הקצר מבין השניים שמופיעים גם בארוך"""
+        shorter = min(len(words), len(other))
+        return shorter > 0 and len(words & other) / shorter >= cls.CONTEXT_OVERLAP_THRESHOLD
+    
+    @staticmethod
+    def _context_block(number: int, text: str) -> str:
+        return f"--- סעיף {number} ---\n{text}\n\n"
+    
+    @classmethod
+    def format_context(cls, results: List[Tuple[str, dict, float]]) -> str:
+        """תוצאות query כטקסט להכנסה ל-prompt (בלי סינון - ראה select_context)"""
+        context = cls.CONTEXT_HEADER
         for i, (text, meta, dist) in enumerate(results, 1):
-            context += f"--- סעיף {i} ---\n{text}\n\n"
+            context += cls._context_block(i, text)
         
         return context
-
@@ -0,0 +1,109 @@
+# ============================================================================
+# rate_limiter.py - תור משותף עם הגבלת קצב לקריאות OpenAI
+# ============================================================================
+
+from collections import deque
+import logging
+import threading
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """הערכה גסה של מספר הטוקנים (עברית יוצאת בערך טוקן לכל 2-3 תווים)"""
+    return len(text) // 3 + 1
+
+
+class RateLimitScheduler:
+    """
+    token bucket כפול - בקשות לדקה (RPM) וטוקנים לדקה (TPM).
+    הממתינים משורתים לפי סדר הגעה (FIFO), כך שכל ה-extractors וה-analyzers
+    בתהליך עוברים באותו תור ואף אחד לא "מדלג" על האחרים.
+    """
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = deque()
+        self._cond = threading.Condition()
+    
+    def acquire(self, tokens: int):
+        """חוסם עד שיש מקום לבקשה אחת ול-tokens טוקנים"""
+        # בקשה גדולה מכל הדלי לא תעבור לעולם - מגבילים אותה לגודל הדלי
+        tokens = min(tokens, self.tokens_per_minute)
+        ticket = object()
+        
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    now = time.monotonic()
+                    
+                    if (self._waiting[0] is ticket and now >= self._paused_until
+                            and self._requests >= 1 and self._tokens >= tokens):
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        return
+                    
+                    self._cond.wait(timeout=self._wait_time(tokens, now))
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+    
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """מתקן את הדלי לפי השימוש בפועל שהחזיר ה-API"""
+        with self._cond:
+            self._tokens = min(self.tokens_per_minute, self._tokens + estimated_tokens - actual_tokens)
+            self._cond.notify_all()
+    
+    def pause(self, seconds: float):
+        """עצירה גלובלית (למשל אחרי 429 עם Retry-After) - חלה על כל הממתינים"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+    
+    def _wait_time(self, tokens: int, now: float) -> float:
+        waits = [self._paused_until - now]
+        if self._requests < 1:
+            waits.append((1 - self._requests) * 60 / self.requests_per_minute)
+        if self._tokens < tokens:
+            waits.append((tokens - self._tokens) * 60 / self.tokens_per_minute)
+        # מי שלא בראש התור מתעורר ב-notify כשהתור מתקדם
+        return min(max(max(waits), 0.05), 5.0)
+
+
+_shared_scheduler: RateLimitScheduler = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_scheduler(requests_per_minute: int = None, tokens_per_minute: int = None) -> RateLimitScheduler:
+    """
+    ה-scheduler היחיד בתהליך. הקריאה הראשונה קובעת את המגבלות (ברירת מחדל: OPENAI_RPM/OPENAI_TPM
+    מ-Config), והבאות מקבלות את אותו מופע.
+    """
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            if requests_per_minute is None or tokens_per_minute is None:
+                from config import Config
+                requests_per_minute = requests_per_minute or Config.OPENAI_RPM
+                tokens_per_minute = tokens_per_minute or Config.OPENAI_TPM
+            _shared_scheduler = RateLimitScheduler(requests_per_minute, tokens_per_minute)
+            logging.info(f"הגבלת קצב OpenAI: {requests_per_minute} בקשות ו-{tokens_per_minute} טוקנים לדקה")
+        return _shared_scheduler
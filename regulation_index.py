@@ -0,0 +1,223 @@
+# ============================================================================
+# regulation_index.py - אינדקס מובנה של התקנות: סעיף -> תת-סעיף -> אחוזים מותרים
+# ============================================================================
+
+import json
+import logging
+from pathlib import Path
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from section_chunker import split_clauses
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+# מספר הסעיף בתחילת התוכן ("סעיף 2:", "סעיף 2א:", "7. (1)") או בכותרת ("(סעיף 22 המשך)")
+_SECTION_AT_START = re.compile(r'^\s*(?:סעיף\s*(?=\d)|(?=\d{1,3}[א-ת]?\s*[:.]))(\d{1,3}[א-ת]?)\s*[:.]?')
+_SECTION_IN_SUBJECT = re.compile(r'סעיף\s*(\d{1,3}[א-ת]?)')
+# רשומה של כמה סעיפים: "(סעיפים 62-63)", "(סעיפים 48-3, 49)"; בתוכן כל סעיף מסומן "(62) ..."
+_SECTIONS_IN_SUBJECT = re.compile(r'סעיפים\s*(\d{1,3}(?:\s*[-–]\s*\d{1,3})?(?:\s*,\s*\d{1,3}(?:\s*[-–]\s*\d{1,3})?)*)')
+_SECTION_MARKER = re.compile(r'\((\d{1,3})\)\s*')
+# סעיף חדש באמצע רשומה ("... (60%). 13. מעיים - (1) ...") - מספר ואחריו, אחרי כותרת קצרה, תת-סעיף ראשון.
+# רשימות ממוספרות בתוך סעיף ("1. במקרי ...") לא עונות על זה, ומספר שלא גדול מהסעיף הנוכחי לא נחשב
+_INLINE_SECTION = re.compile(r'(?<=\s)(\d{1,3}[א-ת]?)\.\s+(?=(?:[^.()\d]{1,40}?\s[-–]\s*)?\(\s*[^()\s]{1,4}\s*\))')
+_NUMBER = r'(\d{1,3}(?:\.\d+)?)\s*%'
+# טווח מדורג: "20% עד 100%", "0%-30%", "בין 10% ל-30%", "(0%) ועד הפרעות קשות (50%)"
+# ("X% - Y%" עם רווחים הוא מדד ואחריו אחוז הנכות, לא טווח)
+_RANGE = re.compile(r'(?<![\d<>=.])(?<!\d-)' + _NUMBER + r'\)?(?:[-–]|\s*ל-\s*|\s*ו?עד\s+(?:[^%()]*?\(\s*)?)' + _NUMBER)
+# "עד 30%" בלי תחילת טווח
+_UP_TO = re.compile(r'(?<![א-ת])עד\s+' + _NUMBER)
+# אחוז נכות בודד - לא סוף של טווח מדידה ("FEV1 60-79%") ולא סף ("<29%", ">=75%")
+_PERCENT = re.compile(r'(?<![\d<>=.])(?<!\d-)(?<!\d–)' + _NUMBER)
+_LABEL = re.compile(r'\(\s*([^()\s]{1,4})\s*\)')
+# הסעיף שהמודל ציין: "סעיף 5(4)(ה)", "פרט 2א (1)", "5 (4) (ה')"
+_CITATION = re.compile(r'(\d{1,3}[א-ת]?)\s*((?:\(\s*[^()\s]{1,4}\s*\)\s*)*)')
+_CITATION_AFTER_WORD = re.compile(r'(?:סעיף|פרט|תקנה)\s*' + _CITATION.pattern)
+
+SectionKey = Tuple[str, Tuple[str, ...]]
+Interval = Tuple[float, float]
+
+
+def _percentages(text: str) -> Set[Interval]:
+    """האחוזים שהטקסט מתיר כקטעים (low, high); אחוז בודד הוא קטע באורך 0"""
+    intervals = set()
+
+    def take(pattern, to_interval):
+        def replace(match):
+            low, high = to_interval(*(float(value) for value in match.groups()))
+            if 0 <= low <= high <= 100:
+                intervals.add((low, high))
+            return ' '
+        return pattern.sub(replace, text)
+
+    text = take(_RANGE, lambda low, high: (low, high))
+    text = take(_UP_TO, lambda high: (0.0, high))
+    take(_PERCENT, lambda value: (value, value))
+    return intervals
+
+
+def _format_interval(interval: Interval) -> str:
+    low, high = interval
+    return f"{low:g}%" if low == high else f"{low:g}%-{high:g}%"
+
+
+def _section_number(section: str) -> int:
+    return int(re.match(r'\d+', section).group())
+
+
+def _subject_sections(subject: str) -> List[str]:
+    """'קשתית ... (סעיפים 64-68)' -> ['64', ..., '68']; '48-3' הוא פרט 3 של סעיף 48, לא טווח"""
+    match = _SECTIONS_IN_SUBJECT.search(subject)
+    if not match:
+        return []
+    sections = []
+    for item in match.group(1).split(','):
+        bounds = [int(value) for value in re.findall(r'\d+', item)]
+        high = bounds[-1] if bounds[-1] >= bounds[0] else bounds[0]
+        sections.extend(str(number) for number in range(bounds[0], high + 1))
+    return list(dict.fromkeys(sections))
+
+
+def _split_marked_sections(sections: List[str], content: str) -> List[Tuple[str, str]]:
+    """
+    תוכן של רשומת "סעיפים N-M": לפי סימוני "(NN)" של הסעיפים, אם יש. סעיף בלי סימון
+    (או רשומה בלי סימונים בכלל) מקבל את כל התוכן - איחוד האחוזים, כמו סעיף שחוזר בכמה פרקים.
+    """
+    markers = [match for match in _SECTION_MARKER.finditer(content) if match.group(1) in sections]
+    if not markers:
+        return [(section, content) for section in sections]
+    parts = [(match.group(1), content[match.end():following.start() if following else len(content)])
+             for match, following in zip(markers, markers[1:] + [None])]
+    marked = {section for section, _ in parts}
+    return parts + [(section, content) for section in sections if section not in marked]
+
+
+def _split_sections(section: str, body: str) -> List[Tuple[str, str]]:
+    """רשומה שמכילה כמה סעיפים ("12. ... 13. מעיים - (1) ...") -> [(סעיף, תוכן), ...]"""
+    parts, start = [], 0
+    for match in _INLINE_SECTION.finditer(body):
+        if _section_number(match.group(1)) <= _section_number(section):
+            continue
+        parts.append((section, body[start:match.start()]))
+        section, start = match.group(1), match.end()
+    parts.append((section, body[start:]))
+    return parts
+
+
+def _normalize_label(label: str) -> str:
+    return label.strip().strip("'\"׳״").upper()
+
+
+def parse_citation(section_used: str) -> Tuple[Optional[str], Tuple[str, ...]]:
+    """'סעיף 5(4)(ה)' -> ('5', ('4', 'ה')); (None, ()) אם אין מספר סעיף"""
+    text = str(section_used or '')
+    match = _CITATION_AFTER_WORD.search(text) or _CITATION.search(text)
+    if not match:
+        return None, ()
+    return match.group(1), tuple(_normalize_label(label) for label in _LABEL.findall(match.group(2)))
+
+
+def format_citation(key: SectionKey) -> str:
+    section, path = key
+    return f"סעיף {section}" + "".join(f"({label})" for label in path)
+
+
+class RegulationIndex:
+    """
+    האחוזים שהתקנות מתירות לכל סעיף ולכל תת-סעיף (וכל קידומת שלו), בטבלה אחת בזיכרון.
+    סעיף שמופיע בכמה רשומות (פרקים שונים עם אותו מספור) מקבל את איחוד האחוזים -
+    הבדיקה מחמירה רק כשהאחוז בוודאות לא מופיע.
+    """
+
+    def __init__(self):
+        self._allowed: Dict[SectionKey, Set[Interval]] = {}
+
+    @classmethod
+    def from_rag_file(cls, rag_file: Path) -> "RegulationIndex":
+        with open(rag_file, 'r', encoding='utf-8') as f:
+            rag_data = json.load(f)
+
+        items = rag_data.values() if isinstance(rag_data, dict) else rag_data
+        index = cls()
+        skipped = 0
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('content'), str):
+                skipped += 1
+                continue
+            content = item['content']
+            subject = str(item.get('subject', ''))
+            match = _SECTION_AT_START.match(content) or _SECTION_IN_SUBJECT.search(subject)
+            if not match:
+                parts = _split_marked_sections(_subject_sections(subject), content)
+                if not parts:
+                    skipped += 1
+                for section, section_body in parts:
+                    index.add_section(section, section_body)
+                continue
+            body = content[match.end():] if match.re is _SECTION_AT_START else content
+            for section, section_body in _split_sections(match.group(1), body):
+                index.add_section(section, section_body)
+
+        sections = len({section for section, _ in index._allowed})
+        logging.info(f"אינדקס תקנות: {sections} סעיפים, {len(index._allowed)} סעיפים ותתי-סעיפים"
+                     f" ({skipped} רשומות בלי מספר סעיף)")
+        return index
+
+    def add_section(self, section: str, body: str):
+        intro, clauses = split_clauses(body)
+        self._add(section, (), _percentages(intro))
+        for clause in clauses:
+            path = tuple(_normalize_label(label) for label in _LABEL.findall(clause['label']))
+            self._add(section, path, _percentages(clause['text']))
+            # פתיחי תתי-הסעיפים העוטפים ("(1) שחפת - 100%") שייכים לקידומת שלהם
+            for depth, text in enumerate(clause['path'], 1):
+                self._add(section, path[:depth], _percentages(text))
+
+    def _add(self, section: str, path: Tuple[str, ...], percentages: Set[Interval]):
+        """האחוזים נוספים לתת-הסעיף ולכל הקידומות שלו, כדי שציטוט חלקי ("5(4)") ייבדק בשליפה אחת"""
+        for depth in range(len(path) + 1):
+            self._allowed.setdefault((section, path[:depth]), set()).update(percentages)
+
+    def __contains__(self, section: str) -> bool:
+        return (section, ()) in self._allowed
+
+    def lookup(self, section: str, path: Tuple[str, ...] = ()) -> Tuple[Optional[SectionKey], Set[Interval]]:
+        """
+        תת-הסעיף העמוק ביותר שקיים באינדקס לאורך path, והאחוזים שהוא מתיר (קטעים (low, high)).
+        (None, set()) אם הסעיף לא קיים.
+        """
+        for depth in range(len(path), -1, -1):
+            key = (section, tuple(path[:depth]))
+            if key in self._allowed:
+                return key, self._allowed[key]
+        return None, set()
+
+    def validate(self, result: dict) -> Optional[str]:
+        """
+        בודק שהסעיף והאחוז שהמודל החזיר קיימים בתקנות.
+        Returns:
+            None אם התוצאה תקינה או שאי אפשר לבדוק אותה (סעיף שאינו באינדקס, אין אחוזים קבועים),
+            אחרת תיאור הבעיה
+        """
+        try:
+            percentage = float(result.get('disability_percentage') or 0)
+        except (TypeError, ValueError):
+            return f"אחוז הנכות '{result.get('disability_percentage')}' אינו מספר"
+        if percentage == 0:
+            return None
+
+        section, path = parse_citation(result.get('section_used'))
+        if section is None:
+            return f"נקבעו {percentage:g}% בלי מספר סעיף"
+        key, allowed = self.lookup(section, path)
+        if key is None:
+            # האינדקס נבנה מ-rag.json ואולי לא מכסה את כל התקנות - אין ממה להסיק שהתשובה שגויה
+            logging.debug(f"סעיף {section} אינו באינדקס התקנות - לא נבדק")
+            return None
+        if allowed and not any(low <= percentage <= high for low, high in allowed):
+            options = ", ".join(_format_interval(interval) for interval in sorted(allowed))
+            return f"{percentage:g}% לא מופיע ב{format_citation(key)} (האחוזים בסעיף: {options})"
+        return None
@@ -0,0 +1,127 @@
+# ============================================================================
+# response_cache.py - cache תשובות על הדיסק (SQLite)
+# ============================================================================
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+class ResponseCache:
+    """
+    cache מפתח-ערך בקובץ SQLite עם פינוי LRU לפי גודל ותפוגה לפי TTL.
+    בטוח לשימוש מכמה threads, ו-WAL מאפשר כמה תהליכים על אותו קובץ.
+    """
+    
+    def __init__(self, path: Path, max_bytes: int = 200 * 1024 * 1024, ttl_seconds: float = None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+        self._conn.commit()
+    
+    @staticmethod
+    def make_key(**parts) -> str:
+        """sha256 של הייצוג הקנוני של כל חלקי המפתח"""
+        blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> str:
+        """מחזיר את הערך השמור או None (ומעדכן את מוני הפגיעות)"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+    
+    def put(self, key: str, value: str):
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': size
+        }
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    def _evict(self):
+        """מוחק רשומות שפג תוקפן, ואז את הישנות ביותר בשימוש עד שחוזרים למגבלת הגודל"""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            oldest = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at LIMIT 50"
+            ).fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
@@ -0,0 +1,118 @@
+# ============================================================================
+# section_chunker.py - פיצול סעיפי התקנות לתתי-סעיפים (clauses) עם הפניה לסעיף האב
+# ============================================================================
+
+import re
+from typing import List, Tuple
+
+# סימוני תתי-סעיפים: (1) / (א) או א. / I, II
+_MARKERS = [
+    ('number', re.compile(r'\((\d{1,3})\)')),
+    ('letter', re.compile(r'\(([א-ת])\)|(?:(?<=\s)|^)([א-ת])\.(?=\s)')),
+    ('roman', re.compile(r'(?<=\s)(I{1,3}|IV|VI{0,3})(?=\s+[א-ת])')),
+]
+# "(א)" שבא אחרי "סעיף קטן" / "בסעיף" / "פרט 5" או צמוד למספר ("5(2)") הוא הפניה ולא תחילת תת-סעיף
+_REFERENCE_BEFORE = re.compile(r'(?:סעיף(?:\s+קטן)?|פרט|תקנה)(?:\s*\d+)?\s*$|\d$')
+
+
+def _find_markers(body: str) -> List[Tuple[int, int, str, str]]:
+    """(התחלה, סוף, סוג, תווית) לכל סימון תת-סעיף, לפי הסדר בטקסט"""
+    found = []
+    for kind, pattern in _MARKERS:
+        for match in pattern.finditer(body):
+            if _REFERENCE_BEFORE.search(body[max(0, match.start() - 12):match.start()]):
+                continue
+            label = next(group for group in match.groups() if group)
+            found.append((match.start(), match.end(), kind, label))
+    found.sort()
+
+    # סימונים חופפים (נדיר) - נשאר הראשון
+    markers = []
+    for marker in found:
+        if not markers or marker[0] >= markers[-1][1]:
+            markers.append(marker)
+    return markers
+
+
+def split_clauses(body: str) -> Tuple[str, List[dict]]:
+    """
+    מפצל את גוף הסעיף לתתי-סעיפים "עלים". עומק כל סוג סימון נקבע לפי סדר ההופעה
+    הראשונה שלו בסעיף (בסעיף אחד (1) מכיל א., ובאחר א. מכיל I).
+
+    Returns:
+        (פתיח - הטקסט שלפני הסימון הראשון,
+         רשימת {'label': "(1)(א)", 'path': [פתיחי תתי-הסעיפים העוטפים], 'text': טקסט העלה})
+    """
+    markers = _find_markers(body)
+    if not markers:
+        return body.strip(), []
+
+    depth_of = {}
+    for _, _, kind, _ in markers:
+        depth_of.setdefault(kind, len(depth_of))
+
+    segments = []
+    for i, (start, _, kind, label) in enumerate(markers):
+        end = markers[i + 1][0] if i + 1 < len(markers) else len(body)
+        segments.append((depth_of[kind], label, body[start:end].strip()))
+
+    clauses = []
+    stack: List[Tuple[int, str, str]] = []
+    for i, (depth, label, text) in enumerate(segments):
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        is_leaf = i + 1 == len(segments) or segments[i + 1][0] <= depth
+        if is_leaf:
+            clauses.append({
+                'label': "".join(f"({l})" for _, l, _ in stack) + f"({label})",
+                'path': [t for _, _, t in stack],
+                'text': text,
+            })
+        else:
+            stack.append((depth, label, text))
+
+    return body[:markers[0][0]].strip(), clauses
+
+
+def chunk_sections(sections: List[dict]) -> Tuple[List[str], List[dict]]:
+    """
+    sections: [{'header': כותרת, 'body': תוכן, 'metadata': {...}}]
+    מחזיר (טקסטים לאינדוקס, metadata) - רשומה לכל תת-סעיף, עם 'parent' = מיקום הסעיף ברשימה.
+    טקסט האינדוקס כולל את הכותרת ואת פתיחי תתי-הסעיפים העוטפים, כדי שתת-סעיף קצר
+    ("(ב) קלה - 20%") עדיין יישלף לפי שם הליקוי.
+    """
+    texts, metadata = [], []
+    for parent, section in enumerate(sections):
+        intro, clauses = split_clauses(section['body'])
+        if not clauses:
+            clauses = [{'label': '', 'path': [], 'text': intro}]
+            intro = ''
+
+        for order, clause in enumerate(clauses):
+            texts.append(" ".join(part for part in [section['header'], intro, *clause['path'], clause['text']] if part))
+            metadata.append({
+                **section['metadata'],
+                'parent': parent,
+                'header': section['header'],
+                'intro': intro,
+                'clause': clause['label'],
+                'clause_order': order,
+                'path': clause['path'],
+                'body': clause['text'],
+            })
+    return texts, metadata
+
+
+def render_section(clause_metas: List[dict]) -> str:
+    """כותרת הסעיף + רק תתי-הסעיפים שנשלפו (בסדר המקורי), כל פתיח עוטף פעם אחת"""
+    first = clause_metas[0]
+    lines = [" ".join(part for part in [first['header'], first['intro']] if part)]
+
+    printed_paths = set()
+    for meta in sorted(clause_metas, key=lambda m: m['clause_order']):
+        for depth, text in enumerate(meta['path']):
+            if (depth, text) not in printed_paths:
+                printed_paths.add((depth, text))
+                lines.append(text)
+        lines.append(meta['body'])
+    return "\n".join(lines)
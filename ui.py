@@ -2,20 +2,14 @@
 # ui.py - ממשק משתמש משופר עם עיצוב מודרני
 # ============================================================================
 
-from datetime import datetime
-import json
 from pathlib import Path
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from threading import Thread
-from typing import List, Tuple
 
 from config import Config
-from disability_analyzer import DisabilityAnalyzer
-from medical_extractor import MedicalJSONExtractor
-from ocr_processor import OCRProcessor
-from openai_client import OpenAIClient
-from rag_system import RAGSystem
+import metrics
+from pipeline import PatientPipeline
 
 class ModernButton(tk.Button):
     """כפתור מודרני עם אפקטים"""
@@ -63,8 +57,35 @@ class DisabilityAssessmentUI:
         }
         
         self.input_dir = None
+        # pipeline אחד לכל חיי החלון - RAG וה-client שנטענו ברקע משמשים את כל הריצות
+        self.pipeline = PatientPipeline(
+            log=self._log,
+            confirm=messagebox.askyesno,
+            refresh_grading=Config.GRADING_MEMO_REFRESH,
+            streaming=Config.STREAMING_PIPELINE
+        )
         self._create_widgets()
         self._center_window()
+        self._start_prewarm()
+    
+    def _start_prewarm(self):
+        """מתחיל לטעון את RAG ומודל ה-embedding ברקע מיד כשהחלון נפתח"""
+        if not Config.RAG_FILE.exists():
+            return
+        thread = Thread(target=self._prewarm)
+        thread.daemon = True
+        thread.start()
+    
+    def _prewarm(self):
+        try:
+            seconds = self.pipeline.prewarm()
+        except Exception as e:
+            # לא חוסם - run() ינסה לטעון שוב ויציג את השגיאה אם היא חוזרת
+            self._log(f"טעינת RAG ברקע נכשלה: {e}", "warning")
+            self.root.after(0, lambda: self._set_status(self.rag_status_label, False))
+            return
+        self._log(f"✓ מודל RAG מוכן ({seconds:.1f} שניות)", "success")
+        self.root.after(0, lambda: self._set_status(self.rag_status_label, True))
     
     def _center_window(self):
         """ממרכז את החלון במסך"""
@@ -280,12 +301,14 @@ class DisabilityAssessmentUI:
         inner_frame = tk.Frame(parent, bg=self.colors['bg_card'])
         inner_frame.pack(fill=tk.X, padx=20, pady=15)
         
-        # RAG Status
-        self._create_status_item(
+        # RAG Status - "נטען" עד שהטעינה ברקע מסתיימת
+        self.rag_status_label = self._create_status_item(
             inner_frame,
             "בסיס נתונים רפואי (RAG)",
             Config.RAG_FILE.exists()
         )
+        if Config.RAG_FILE.exists():
+            self.rag_status_label.config(text="⏳ נטען", bg="#fff3e0", fg="#e65100")
         
         # AI Engine Status
         self._create_status_item(
@@ -317,20 +340,22 @@ class DisabilityAssessmentUI:
         ).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=10, pady=10)
         
         # Status badge
-        status_text = "✓ מחובר" if is_active else "✗ לא זמין"
-        status_bg = "#c8e6c9" if is_active else "#ffcdd2"
-        status_fg = "#1b5e20" if is_active else "#b71c1c"
-        
         status_label = tk.Label(
             item_frame,
-            text=status_text,
             font=("Segoe UI", 9, "bold"),
-            bg=status_bg,
-            fg=status_fg,
             padx=12,
             pady=5
         )
+        self._set_status(status_label, is_active)
         status_label.pack(side=tk.RIGHT, padx=10)
+        return status_label
+    
+    def _set_status(self, status_label, is_active):
+        status_label.config(
+            text="✓ מחובר" if is_active else "✗ לא זמין",
+            bg="#c8e6c9" if is_active else "#ffcdd2",
+            fg="#1b5e20" if is_active else "#b71c1c"
+        )
     
     def _select_directory(self):
         """בחירת תיקייה"""
@@ -369,82 +394,16 @@ class DisabilityAssessmentUI:
             self._log("מתחיל תהליך ניתוח רפואי", "info")
             self._log("=" * 60, "header")
             
-            ocr_dir = self.input_dir / "ocr_txt"
-            json_dir = Config.OUTPUT_DIR / "extracted_json"
-            consolidated_file = json_dir / "all_medical_data_consolidated.json"
-            
-            medical_data = None
-
-            if consolidated_file.exists():
-                self._log(f"נמצא קובץ נתונים מאוחד: {consolidated_file.name}", "info")
-                use_existing = messagebox.askyesno(
-                    "נתונים קיימים",
-                    "נמצא קובץ אבחנות רפואיות מוכן.\nהאם להשתמש בו ולדלג לניתוח אחוזי הנכות?"
-                )
-                
-                if use_existing:
-                    with open(consolidated_file, 'r', encoding='utf-8') as f:
-                        medical_data = json.load(f)
-                    self._log("✓ טוען נתונים מקובץ קיים", "success")
-
-            if medical_data is None:
-                existing_txt = list(ocr_dir.glob("*.txt")) if ocr_dir.exists() else []
-                if existing_txt:
-                    self._log(f"נמצאו {len(existing_txt)} קבצי טקסט קיימים", "info")
-                    ocr_response = messagebox.askyesno(
-                        "קבצי טקסט קיימים",
-                        "נמצאו קבצי טקסט מעיבוד קודם.\nלהשתמש בהם במקום להריץ OCR מחדש?"
-                    )
-                    if ocr_response:
-                        txt_files = existing_txt
-                    else:
-                        txt_files, failed = self._run_ocr()
-                else:
-                    self._log("שלב 1/4: מבצע OCR על המסמכים...", "info")
-                    txt_files, failed = self._run_ocr()
-
-                if not txt_files:
-                    raise Exception("לא נמצאו קבצי טקסט לעיבוד")
-
-                # חילוץ JSON
-                self._log("שלב 2/4: חילוץ מידע רפואי באמצעות AI...", "info")
-                ai_client = OpenAIClient(api_key=Config.OPENAI_API_KEY, model=Config.GPT_MODEL)
-                extractor = MedicalJSONExtractor(ai_client)
-                
-                json_dir.mkdir(exist_ok=True)
-                medical_data = extractor.extract_from_directory(ocr_dir, json_dir)
-                self._log("✓ חילוץ מידע הושלם", "success")
-
-            if not medical_data or not medical_data.get('diagnoses_by_body_part'):
-                raise Exception("לא נמצאו אבחנות רפואיות בנתונים")
-
-            self._log("שלב 3/4: טעינת בסיס נתונים רפואי (RAG)...", "info")
-            rag = self._load_rag()
-
-            self._log("שלב 4/4: ניתוח והערכת אחוזי נכות...", "info")
+            run_metrics = metrics.start_run(pricing=Config.MODEL_PRICING)
             
-            if 'ai_client' not in locals():
-                ai_client = OpenAIClient(api_key=Config.OPENAI_API_KEY, model=Config.GPT_MODEL)
-                
-            analyzer = DisabilityAnalyzer(ai_client, rag)
-            results = analyzer.analyze_patient_data(medical_data)
-            self._log("✓ חישוב אחוזי נכות הושלם", "success")
-
-            results_file = Config.OUTPUT_DIR / "final_disability_assessment.json"
-            with open(results_file, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
-
-            report = self._generate_report(results)
-            report_file = Config.OUTPUT_DIR / "disability_report.txt"
-            with open(report_file, 'w', encoding='utf-8') as f:
-                f.write(report)
+            results = self.pipeline.run(self.input_dir, Config.OUTPUT_DIR)
+            self.pipeline.write_metrics(run_metrics, Config.OUTPUT_DIR)
 
             self._log("=" * 60, "header")
             self._log("✓✓✓ התהליך הושלם בהצלחה ✓✓✓", "success")
-            self._log(f"תוצאות נשמרו ב: {results_file.name}", "info")
-            self._log(f"דוח נשמר ב: {report_file.name}", "info")
             self._log("=" * 60, "header")
 
+
             self._log("\n📊 סיכום נכות:", "header")
             for item in results.get('breakdown', []):
                 self._log(f"  • {item['organ']}: {item['percent']}% (סעיף {item['section']})", "info")
@@ -469,108 +428,6 @@ class DisabilityAssessmentUI:
             self._log(traceback.format_exc(), "error")
             self.root.after(0, self._processing_error)
     
-    def _run_ocr(self) -> Tuple[List[Path], List[Path]]:
-        """מריץ OCR"""
-        ocr = OCRProcessor(
-            tesseract_path=Config.TESSERACT_PATH,
-            languages=Config.OCR_LANGUAGES
-        )
-        ocr_dir = self.input_dir / "ocr_txt"
-        successful, failed = ocr.process_directory(self.input_dir, ocr_dir)
-        
-        self._log(f"✓ OCR הושלם: {len(successful)} הצליחו, {len(failed)} נכשלו", "success")
-        
-        if failed:
-            self._log("קבצים שנכשלו:", "warning")
-            for f in failed:
-                self._log(f"  • {f.name}", "warning")
-        
-        return successful, failed
-    
-    def _load_rag(self) -> RAGSystem:
-        """טוען RAG"""
-        with open(Config.RAG_FILE, 'r', encoding='utf-8') as f:
-            rag_data = json.load(f)
-        
-        texts = []
-        metadata = []
-        
-        if isinstance(rag_data, dict):
-            for key, value in rag_data.items():
-                text = json.dumps(value, ensure_ascii=False) if isinstance(value, dict) else str(value)
-                texts.append(text)
-                metadata.append({'section_number': key, 'title': key})
-        
-        elif isinstance(rag_data, list):
-            for i, item in enumerate(rag_data):
-                if isinstance(item, dict):
-                    text = json.dumps(item, ensure_ascii=False)
-                    section_id = item.get('id') or item.get('section') or f"section_{i}"
-                    title = item.get('title') or section_id
-                else:
-                    text = str(item)
-                    section_id = f"section_{i}"
-                    title = section_id
-                
-                texts.append(text)
-                metadata.append({'section_number': section_id, 'title': title})
-        
-        rag = RAGSystem(model_path=Config.EMBEDDING_MODEL)
-        rag.build_index(texts, metadata)
-        
-        self._log(f"✓ RAG נטען: {len(texts)} רשומות", "success")
-        return rag
-    
-    def _generate_report(self, results: dict) -> str:
-        """יצירת דוח"""
-        report = f"""
-╔══════════════════════════════════════════════════════════════════╗
-║              דוח הערכת נכות - ביטוח לאומי                       ║
-╚══════════════════════════════════════════════════════════════════╝
-
-תאריך: {datetime.now().strftime('%d/%m/%Y %H:%M')}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-אחוזי נכות לפי איברים
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-"""
-        for item in results.get('breakdown', []):
-            report += f"🔹 {item['organ']}: {item['percent']}% (סעיף {item['section']})\n"
-        
-        report += f"""
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-נכות מצטברת
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-סה"כ לפי נוסחת בלבנד: {results.get('total_disability', 0)}%
-
-הערות:
-1. זהו חישוב ראשוני - יש להתייעץ עם עו"ד מומחה
-2. נדרשת בדיקת חפיפות בין פגיעות
-3. החישוב דורש אישור רפואי מוסמך
-
-"""
-        
-        missing_info_items = [
-            r for r in results.get('full_results', []) 
-            if float(r.get('disability_percentage', 0)) == 0
-        ]
-        
-        if missing_info_items:
-            report += """
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-⚠️  איברים הדורשים התייחסות רפואית נוספת (0%)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-"""
-            for item in missing_info_items:
-                report += f"🔸 {item['body_part']}\n"
-                reason = item.get('reasoning', 'נדרש תיעוד רפואי נוסף')
-                report += f"   הנחיה: {reason}\n\n"
-        
-        return report
-    
     def _log(self, message: str, tag: str = ""):
         """הוספת הודעה ללוג"""
         def append():
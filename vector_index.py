@@ -0,0 +1,115 @@
+# ============================================================================
+# vector_index.py - בניית אינדקסי FAISS לפי סוג (מדויק / HNSW / IVF-PQ / דחיסה)
+# ============================================================================
+
+import logging
+import math
+
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+# סוגי האינדקס הנתמכים:
+#   flat_l2  - מדויק, L2 (ברירת המחדל, כמו עד היום)
+#   flat_ip  - מדויק, מכפלה פנימית על וקטורים מנורמלים (= דמיון קוסינוס)
+#   hnsw     - גרף HNSW, מהיר בקורפוס גדול, בלי אימון (params: M, ef_construction, ef_search)
+#   ivf_pq   - IVF עם product quantization, דורש אימון (params: nlist, m, nbits, nprobe)
+#   sq8      - scalar quantization ל-8 ביט, רבע מהזיכרון של float32
+#   pq       - product quantization בלי IVF (params: m, nbits)
+INDEX_TYPES = ("flat_l2", "flat_ip", "hnsw", "ivf_pq", "sq8", "pq")
+
+# סוגים שבהם הווקטורים נשמרים דחוסים (אין צורך להחזיק את ה-embeddings המקוריים בזיכרון)
+COMPRESSED_TYPES = ("ivf_pq", "sq8", "pq")
+
+DEFAULT_PARAMS = {
+    'M': 32,
+    'ef_construction': 200,
+    'ef_search': 64,
+    'nlist': 256,
+    'nprobe': 16,
+    'm': 16,
+    'nbits': 8,
+}
+
+
+def requires_normalized(index_type: str) -> bool:
+    """flat_ip מחזיר דמיון קוסינוס רק על וקטורים מנורמלים"""
+    return index_type == "flat_ip"
+
+
+def uses_inner_product(index_type: str) -> bool:
+    return index_type == "flat_ip"
+
+
+def build_index(embeddings: np.ndarray, index_type: str = "flat_l2", params: dict = None):
+    """בונה (ומאמן אם צריך) אינדקס מהסוג המבוקש ומוסיף אליו את כל הווקטורים"""
+    import faiss
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"סוג אינדקס לא מוכר: {index_type} (אפשרויות: {', '.join(INDEX_TYPES)})")
+
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    count, dim = embeddings.shape
+
+    if index_type == "flat_l2":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "flat_ip":
+        index = faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params['M'])
+        index.hnsw.efConstruction = params['ef_construction']
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+    else:
+        m = _subquantizers(dim, params['m'])
+        nbits = _pq_bits(count, params['nbits'])
+        if index_type == "pq":
+            index = faiss.IndexPQ(dim, m, nbits)
+        else:
+            # faiss ממליץ על 39 נקודות אימון לפחות לכל רשימה
+            nlist = max(1, min(params['nlist'], count // 39))
+            quantizer = faiss.IndexFlatL2(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, nbits)
+        if (m, nbits) != (params['m'], params['nbits']):
+            logging.info(f"PQ הותאם לקורפוס: m={m}, nbits={nbits} ({count} וקטורים, מימד {dim})")
+
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    configure_search(index, params)
+    return index
+
+
+def configure_search(index, params: dict = None):
+    """פרמטרי חיפוש (לא נשמרים בקובץ האינדקס - צריך להגדיר גם אחרי טעינה)"""
+    import faiss
+
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = params['ef_search']
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(params['nprobe'], index.nlist)
+        # נדרש ל-reconstruct (מרחק לסעיף שנמצא רק ב-BM25)
+        index.make_direct_map()
+
+
+def index_bytes(index) -> int:
+    """גודל האינדקס המסודר - קירוב טוב לזיכרון שהוא תופס"""
+    import faiss
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def _subquantizers(dim: int, requested: int) -> int:
+    """המחלק הגדול ביותר של המימד שלא עולה על requested (PQ דורש חלוקה שווה)"""
+    for m in range(min(requested, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _pq_bits(count: int, requested: int) -> int:
+    """באימון PQ צריך לפחות 2^nbits וקטורים"""
+    return max(1, min(requested, int(math.log2(max(count, 2)))))